@@ -0,0 +1,581 @@
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import pathlib
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from itertools import product
+import numpy as np
+from srt_rfu.mp_pool import map_tasks
+from srt_rfu.srt_rfu32 import SrtRfu32
+
+
+class IpcProbe(SrtRfu32):
+    "SrtRfu32 whose task does no work, so that only dispatch is timed"
+
+    def probe(self, *task):
+        return task
+
+
+def get_probe(tc):
+    probe = IpcProbe('.')
+    probe.grid = {}
+    for idx, cam in enumerate(probe.cam_keys):
+        probe.grid[cam] = {}
+        for ind in range(16):
+            i, j = divmod(ind, 4)
+            well = probe.get_well_name4grid(i, j, idx)
+            probe.grid[cam][well] = [
+                100.0+300*j, 100.0+300*i, 400.0+300*j, 400.0+300*i]
+    paramlist = list(product(range(len(probe.temp_li)), probe.ch_dict.keys(),
+                             range(tc), probe.cam_keys))
+    task_li = list(product(range(len(probe.temp_li)),
+                           range(len(probe.ch_dict)), range(tc),
+                           range(len(probe.cam_keys))))
+    return probe, paramlist, task_li
+
+
+def bench_ipc(args):
+    "per task payload and dispatch time of a full 32 well run"
+    probe, paramlist, task_li = get_probe(args.tc)
+    old_bytes = len(pickle.dumps((probe.probe, paramlist[0])))
+    new_bytes = len(pickle.dumps(task_li[0]))
+
+    t = time.time()
+    with concurrent.futures.ProcessPoolExecutor() as executor:
+        list(executor.map(probe.probe, paramlist))
+    old_sec = time.time() - t
+    t = time.time()
+    map_tasks(probe, 'probe', task_li, desc='initializer pool')
+    new_sec = time.time() - t
+
+    print('{} tasks'.format(len(task_li)))
+    print('{:<24}{:>14}{:>12}'.format('', 'bytes/task', 'sec'))
+    print('{:<24}{:>14}{:>12.3f}'.format(
+        'pickled analyzer', old_bytes, old_sec))
+    print('{:<24}{:>14}{:>12.3f}'.format(
+        'initializer pool', new_bytes, new_sec))
+
+
+# statements run in a fresh interpreter by bench_startup, by step name
+STARTUP_STEPS = {
+    '16': [
+        ('import', 'from srt_rfu.srt_rfu16_dev import SrtRfu16Dev'),
+        ('analyzer', 'rfu = SrtRfu16Dev(exp_path)'),
+        ('first frame', 'im_path = rfu.cam_path/"0_0_{}.jpg".format('
+         'list(rfu.ch_dict)[0])\n'
+         'rfu.prime_grid(im_path)\n'
+         'rfu.mp_rfu(im_path, is_outf=False)'),
+    ],
+    '32': [
+        ('import', 'from srt_rfu.srt_rfu32 import SrtRfu32'),
+        ('analyzer', 'rfu = SrtRfu32(exp_path)'),
+    ],
+    '96': [
+        ('import', 'from srt_rfu.srt_rfu96 import SrtRfu96'),
+        ('analyzer', 'rfu = SrtRfu96(exp_path).get_block_li()[0]'),
+    ],
+}
+# first frame of camera 0 of a 32 well block, grid included
+STARTUP_BLOCK_FRAME = (
+    'cam = rfu.cam_keys[0]\n'
+    'rfu.grid = {cam: rfu.set_grid_single(rfu.get_grid_im_path(0, tc))}\n'
+    'im_path = rfu.exp_path/cam/"0_0_{}.jpg".format(list(rfu.ch_dict)[0])\n'
+    'rfu.calculate_rfu(rfu.segment_frame(im_path), cam)')
+STARTUP_STEPS['32'].append(('first frame', STARTUP_BLOCK_FRAME))
+STARTUP_STEPS['96'].append(('first frame', STARTUP_BLOCK_FRAME))
+
+
+def get_startup_code(well, exp_path, tc):
+    "script that prints the wall clock time at the end of every step"
+    line_li = ['import time', 'exp_path, tc = {!r}, {}'.format(
+        str(exp_path), tc)]
+    for name, code in STARTUP_STEPS[well]:
+        line_li += [code, 'print({!r}, repr(time.time()))'.format(name)]
+    return '\n'.join(line_li)
+
+
+def time_startup(well, exp_path, tc):
+    "seconds from interpreter launch to the end of every step"
+    code = get_startup_code(well, exp_path, tc)
+    t = time.time()
+    out = subprocess.check_output(
+        [sys.executable, '-c', code],
+        cwd=str(pathlib.Path(__file__).resolve().parent))
+    step_li = []
+    for line in out.decode('utf-8').splitlines():
+        name, _, stamp = line.rpartition(' ')
+        step_li.append((name, float(stamp) - t))
+    return step_li
+
+
+def bench_startup(args):
+    "time to reach the first processed frame from a cold interpreter"
+    run_li = [time_startup(args.well, args.exp_path, args.tc)
+              for _ in range(args.repeat)]
+    t = time.time()
+    subprocess.call(['git', 'rev-parse', '--short', 'HEAD'],
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    git_sec = time.time() - t
+
+    print('{} well, best of {}'.format(args.well, args.repeat))
+    print('{:<24}{:>12}{:>12}'.format('', 'step sec', 'total sec'))
+    last = 0
+    for ind, (name, _) in enumerate(run_li[0]):
+        total = min(run[ind][1] for run in run_li)
+        print('{:<24}{:>12.3f}{:>12.3f}'.format(name, total - last, total))
+        last = total
+    print('{:<24}{:>12.3f}'.format('git rev-parse fork', git_sec))
+
+
+# modules of the datasheet path, and the plotting modules they must not load
+# modules of the datasheet path: the analyzers and the scripts running them
+IMPORT_MODULE_LI = ['srt_rfu.srt_rfu16_dev', 'srt_rfu.srt_rfu32',
+                    'srt_rfu.srt_rfu96', 'srt_rfu.srt_rfu16_legacy',
+                    'pix2rfu_16well', 'pix2rfu_16well_legacy',
+                    'pix2rfu_32well', 'pix2rfu_96well', 'exp2rfu',
+                    'exp2rfu_v2', 'exp2rfu_v3', 'rfu2xlsx']
+IMPORT_BANNED_LI = ['matplotlib', 'skimage.color', 'srt_rfu.qc_plot',
+                    'srt_rfu.heat_map']
+IMPORT_CODE = """import sys, time
+t = time.time()
+import {module}
+print(time.time() - t)
+print(' '.join(name for name in {banned!r} if name in sys.modules))
+"""
+
+
+def bench_imports(args):
+    """
+    Import time of each datasheet module in a fresh interpreter, checked
+    against a time budget and the plotting modules it must not load.
+    Exits with status 1 when a module fails the check.
+    """
+    is_ok = True
+    print('{:<28}{:>10}  {}'.format('module', 'sec', 'plotting modules'))
+    for module in args.module or IMPORT_MODULE_LI:
+        code = IMPORT_CODE.format(module=module, banned=IMPORT_BANNED_LI)
+        sec_li = []
+        for _ in range(args.repeat):
+            out = subprocess.check_output(
+                [sys.executable, '-c', code],
+                cwd=str(pathlib.Path(__file__).resolve().parent))
+            sec, banned = out.decode('utf-8').split('\n')[:2]
+            sec_li.append(float(sec))
+        sec = min(sec_li)
+        is_ok &= sec <= args.budget and not banned
+        print('{:<28}{:>10.3f}  {}'.format(module, sec, banned or '-'))
+    print('budget {:.3f} sec: {}'.format(
+        args.budget, 'ok' if is_ok else 'FAILED'))
+    if not is_ok:
+        sys.exit(1)
+
+
+def bench_watch(args):
+    """
+    Replay a finished run into a temporary directory at instrument cadence
+    and process it in watch mode. Reports how long after the last frame was
+    written the RFU table is done.
+    """
+    from srt_rfu.srt_rfu16_dev import SrtRfu16Dev
+    from srt_rfu.srt_rfu96 import SrtRfu96
+    from srt_rfu.watch import replay_frames
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        src_path = pathlib.Path(args.exp_path)
+        dst_path = pathlib.Path(tmp_dir)/src_path.name
+        replay = multiprocessing.Process(target=replay_frames, args=(
+            src_path, dst_path, args.cycle_sec))
+        replay.start()
+        if args.well == '16':
+            rfu = SrtRfu16Dev(dst_path, args.dye_exempt)
+        else:
+            rfu = SrtRfu96(dst_path, args.dye_exempt)
+        rfu.watch_rfu_table(tc=args.tc, poll_sec=args.poll_sec)
+        t = time.time()
+        replay.join()
+        last_frame = max(im_path.stat().st_mtime
+                         for im_path in dst_path.rglob('*.jpg'))
+    print('RFU table done {:.3f} sec after the last frame'.format(
+        t - last_frame))
+
+
+def bench_morph(args):
+    """
+    Opening and closing of thresholded frames by the skimage grayscale
+    morphology and by srt_rfu.morphology, timed per frame and checked to
+    give the same masks. Exits with status 1 when a mask differs.
+    """
+    from skimage.morphology import closing, disk, opening
+    from srt_rfu.morphology import disk_closing, disk_opening
+    rfu = SrtRfu32('.')
+    im_path_li = sorted(pathlib.Path(args.exp_path).rglob('*_*_*.jpg'))
+    im_path_li = im_path_li[::max(1, len(im_path_li)//args.frames)]
+    is_ok = True
+    sec = {'skimage': 0.0, 'srt_rfu': 0.0}
+    for im_path in im_path_li:
+        threshed_im, _ = rfu.threshold_image(im_path)
+        t = time.time()
+        bw = opening(threshed_im, disk(rfu.OPENING_RADIUS))
+        bw = closing(bw, disk(rfu.CLOSING_RADIUS))
+        sec['skimage'] += time.time() - t
+        t = time.time()
+        bw_fast = disk_opening(threshed_im, rfu.OPENING_RADIUS)
+        bw_fast = disk_closing(bw_fast, rfu.CLOSING_RADIUS)
+        sec['srt_rfu'] += time.time() - t
+        n_diff = np.count_nonzero(bw != bw_fast)
+        is_ok &= not n_diff
+        if n_diff:
+            print('{}: {} pixels differ'.format(im_path, n_diff))
+    print('{} frames'.format(len(im_path_li)))
+    print('{:<24}{:>12}'.format('', 'sec/frame'))
+    for name, total in sec.items():
+        print('{:<24}{:>12.3f}'.format(name, total/max(1, len(im_path_li))))
+    print('masks: {}'.format('same' if is_ok else 'DIFFERENT'))
+    if not is_ok:
+        sys.exit(1)
+
+
+def write_synth_run(engine, exp_path, tc):
+    """
+    Synthetic run of an engine in the folders it reads, rendered by
+    srt_rfu.synth from the dummy_data curves.
+    Returns the number of frames written.
+    """
+    from srt_rfu import synth
+    exp_path = pathlib.Path(exp_path)
+    if engine == 'SrtRfu16':
+        from srt_rfu.srt_rfu16_dev import SrtRfu16Dev
+        rfu = SrtRfu16Dev(exp_path/'main')
+        layout = synth.WellLayout()
+        layout.set_wells(synth.get_lattice(
+            layout.view_shape, rfu.get_well_name4grid))
+        synth.write_ref_frame(rfu.cam_path, layout,
+                              synth.get_lattice_box(layout.view_shape))
+        layout_li = [('main', layout)]
+    elif engine == 'SrtRfu16Leg':
+        from srt_rfu.srt_rfu16_legacy import SrtRfu16Leg
+        rfu = SrtRfu16Leg(exp_path)
+        layout = synth.WellLayout(synth.FRAME_SHAPE, rfu.y_range,
+                                  rfu.x_range)
+        layout.set_wells(synth.get_lattice(
+            layout.view_shape, rfu.get_well_name4grid))
+        layout_li = [('.', layout)]
+    elif engine == 'SrtRfu32':
+        rfu = SrtRfu32(exp_path)
+        layout_li = synth.get_block_layout_li(rfu)
+    elif engine == 'SrtRfu96':
+        from srt_rfu.srt_rfu96 import SrtRfu96
+        rfu = SrtRfu96(exp_path)
+        layout_li = [cam_layout for block in rfu.get_block_li()
+                     for cam_layout in synth.get_block_layout_li(block)]
+        rfu = rfu.rfu_back
+    else:
+        # ExpRfu: a folder by step, wells in the cells of its fixed grid
+        from exp2rfu import ExpRfu
+        rfu = ExpRfu(exp_path)
+        layout = synth.WellLayout(synth.FRAME_SHAPE, rfu.y_range,
+                                  rfu.x_range)
+        layout.set_wells(OrderedDict(
+            (well, ((pts[0]+pts[2])/2, (pts[1]+pts[3])/2))
+            for well, pts in rfu.set_grid_single(None).items()))
+        path_li = synth.QUANT_CURVE_LI + [synth.MELT_CURVE]
+        curves = synth.SynthCurves(path_li)
+        return sum(synth.write_step_frames(
+            exp_path/pathlib.Path(path).parent.name, layout, curves,
+            step_ind, rfu.ch_dict, tc)
+            for step_ind, path in enumerate(path_li))
+
+    curves = synth.SynthCurves()
+    return sum(synth.write_cycle_frames(exp_path/cam, layout, curves,
+                                        rfu.ch_dict, tc)
+               for cam, layout in layout_li)
+
+
+def bench_synth(args):
+    "write a synthetic run of an engine"
+    n_frame = write_synth_run(args.engine, args.out_path, args.tc)
+    print('{} frames of {} written in {}'.format(
+        n_frame, args.engine, args.out_path))
+
+
+# statements of a run of each engine on a synthetic run, by stage name
+SUITE_STEPS = OrderedDict([
+    ('SrtRfu16', [
+        ('import', 'from srt_rfu.srt_rfu16_dev import SrtRfu16Dev'),
+        ('analyzer', 'rfu = SrtRfu16Dev(exp_path/"main", dye_exempt)'),
+        ('rfu table', 'rfu.make_rfu_table(tc=tc)'),
+    ]),
+    ('SrtRfu16Leg', [
+        ('import', 'from srt_rfu.srt_rfu16_legacy import SrtRfu16Leg'),
+        ('analyzer', 'rfu = SrtRfu16Leg(exp_path, dye_exempt)'),
+        # set_grid itself looks for the frame at the file system root
+        ('grid', 'rfu.grid = rfu.set_grid_single(exp_path/"{}_0_{}.jpg"'
+         '.format(tc-1, list(rfu.ch_dict)[0]))'),
+        ('rfu table', 'rfu.make_rfu_table(tc=tc)'),
+    ]),
+    ('SrtRfu32', [
+        ('import', 'from srt_rfu.srt_rfu32 import SrtRfu32'),
+        ('analyzer', 'rfu = SrtRfu32(exp_path, dye_exempt)'),
+        ('grid', 'rfu.set_grid(tc=tc)'),
+        ('rfu table', 'rfu.make_rfu_table(tc=tc)'),
+    ]),
+    ('SrtRfu96', [
+        ('import', 'from srt_rfu.srt_rfu96 import SrtRfu96'),
+        ('analyzer', 'rfu = SrtRfu96(exp_path, dye_exempt)'),
+        ('rfu table', 'rfu.concat_rfu_table(tc=tc)'),
+    ]),
+    ('ExpRfu', [
+        ('import', 'from exp2rfu import ExpRfu'),
+        ('analyzer', 'rfu = ExpRfu(exp_path)'),
+        ('rfu table', 'rfu.run_datasheet_loop()'),
+    ]),
+])
+# stages that do not process frames, left out of frames/s
+SUITE_SETUP_STEPS = ['import', 'analyzer']
+SUITE_MARK = '@bench'
+# ru_maxrss of a process counts the memory of the process it was launched
+# from too, as Linux keeps it across exec, so its own peak is VmHWM
+SUITE_RSS_CODE = """try:
+    import resource
+except ImportError:
+    resource = None
+if resource:
+    rss_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    try:
+        with open('/proc/self/status') as f:
+            rss_kb = max([rss_kb] + [int(line.split()[1]) for line in f
+                                     if line.startswith('VmHWM:')])
+    except OSError:
+        rss_kb = max(rss_kb,
+                     resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    print({mark!r}, 'peak_rss_mb', rss_kb/1024)
+"""
+# baseline stages shorter than this are too noisy to compare
+SUITE_MIN_SEC = 0.1
+
+
+def get_suite_code(engine, exp_path, tc, dye_exempt):
+    """
+    script of a run that prints the wall clock time at the end of every
+    stage, then the peak RSS of its largest process where the platform
+    reports it
+    """
+    line_li = ['import pathlib, time',
+               'exp_path, tc, dye_exempt = pathlib.Path({!r}), {}, {!r}'
+               .format(str(exp_path), tc, dye_exempt)]
+    for name, code in SUITE_STEPS[engine]:
+        line_li += [code, 'print({!r}, {!r}, repr(time.time()))'.format(
+            SUITE_MARK, name)]
+    line_li.append(SUITE_RSS_CODE.format(mark=SUITE_MARK))
+    return '\n'.join(line_li)
+
+
+def time_suite_run(engine, exp_path, tc, dye_exempt):
+    "seconds of every stage of a run and its peak RSS in MB, or None"
+    code = get_suite_code(engine, exp_path, tc, dye_exempt)
+    t = time.time()
+    out = subprocess.check_output(
+        [sys.executable, '-c', code],
+        cwd=str(pathlib.Path(__file__).resolve().parent))
+    stage_sec, peak_rss = OrderedDict(), None
+    for line in out.decode('utf-8').splitlines():
+        if not line.startswith(SUITE_MARK + ' '):
+            continue
+        name, _, val = line[len(SUITE_MARK)+1:].rpartition(' ')
+        if name == 'peak_rss_mb':
+            peak_rss = float(val)
+        else:
+            stage_sec[name] = float(val) - t
+            t = float(val)
+    return stage_sec, peak_rss
+
+
+def get_suite_result(engine, exp_path, tc, dye_exempt, repeat):
+    "best of repeat runs of an engine, see bench_suite"
+    run_li = [time_suite_run(engine, exp_path, tc, dye_exempt)
+              for _ in range(repeat)]
+    stage_sec = OrderedDict(
+        (name, min(run[0][name] for run in run_li))
+        for name in run_li[0][0])
+    rss_li = [run[1] for run in run_li if run[1] is not None]
+    n_frame = sum(1 for im_path in pathlib.Path(exp_path).rglob('*.jpg')
+                  if im_path.name != 'ref.jpg')
+    return {
+        'tc': tc, 'frames': n_frame, 'cpu_count': os.cpu_count(),
+        'stage_sec': stage_sec,
+        'fps': n_frame/sum(sec for name, sec in stage_sec.items()
+                           if name not in SUITE_SETUP_STEPS),
+        'peak_rss_mb': min(rss_li) if rss_li else None}
+
+
+def compare_suite_result(result, base, tolerance):
+    """
+    print a result next to its baseline.
+    Returns False when a stage is more than tolerance slower, frames/s
+    more than tolerance lower or the peak RSS more than tolerance higher.
+    """
+    is_comparable = base and all(
+        base[key] == result[key] for key in ['tc', 'frames', 'cpu_count'])
+    if base and not is_comparable:
+        print('baseline is of another run size or machine, not compared')
+    if not is_comparable:
+        base = {'stage_sec': {}, 'fps': None, 'peak_rss_mb': None}
+    is_ok = True
+    row_li = [(name, sec, base['stage_sec'].get(name), True)
+              for name, sec in result['stage_sec'].items()]
+    row_li += [('frames/s', result['fps'], base['fps'], False),
+               ('peak RSS MB', result['peak_rss_mb'], base['peak_rss_mb'],
+                True)]
+    print('{:<24}{:>12}{:>12}'.format('', 'value', 'baseline'))
+    for name, val, base_val, lower_is_better in row_li:
+        flag = ''
+        if val is not None and base_val is not None and (
+                name in result['stage_sec'] and base_val >= SUITE_MIN_SEC
+                or name not in result['stage_sec']):
+            ratio = val/base_val if lower_is_better else base_val/val
+            if ratio > 1 + tolerance:
+                flag = '  REGRESSION'
+                is_ok = False
+        print('{:<24}{:>12}{:>12}{}'.format(
+            name, '-' if val is None else '{:.3f}'.format(val),
+            '-' if base_val is None else '{:.3f}'.format(base_val), flag))
+    return is_ok
+
+
+def bench_suite(args):
+    """
+    Run every engine on a synthetic run of tc cycles in a fresh interpreter
+    and report the time of each stage, frames/s and peak RSS against the
+    stored baselines. With --save the results become the baselines.
+    Exits with status 1 when an engine regressed.
+    """
+    from srt_rfu.synth import SynthCurves
+    baseline_path = pathlib.Path(args.baseline)
+    baseline = {}
+    if baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text())
+    engine_li = args.engine or list(SUITE_STEPS)
+    for engine in engine_li:
+        if engine not in SUITE_STEPS:
+            sys.exit('unknown engine {}'.format(engine))
+    dye_exempt = SynthCurves().get_dye_exempt(SrtRfu32('.').ch_dict)
+    is_ok = True
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_path = pathlib.Path(args.data or tmp_dir)
+        for engine in engine_li:
+            exp_path = data_path/'{}_tc{}'.format(engine, args.tc)
+            if not exp_path.exists():
+                write_synth_run(engine, exp_path, args.tc)
+            result = get_suite_result(engine, exp_path, args.tc,
+                                      dye_exempt, args.repeat)
+            print('{}: {} frames, {} cycles'.format(
+                engine, result['frames'], args.tc))
+            is_ok &= compare_suite_result(
+                result, baseline.get(engine), args.tolerance)
+            baseline[engine] = result if args.save else baseline.get(engine)
+    if args.save:
+        baseline_path.write_text(json.dumps(
+            {key: val for key, val in baseline.items() if val}, indent=2))
+        print('baselines saved in {}'.format(baseline_path))
+    print('suite: {}'.format('ok' if is_ok else 'REGRESSION'))
+    if not is_ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmarks of the RFU pipelines')
+    subparsers = parser.add_subparsers(title='benchmark', dest='bench')
+    subparsers.required = True
+    parser_ipc = subparsers.add_parser(
+        'ipc', help='task dispatch cost of the process pool')
+    parser_ipc.add_argument('-t', '--tc', type=int, default=45,
+                            help='total cycle. default is 45')
+    parser_ipc.set_defaults(func=bench_ipc)
+    parser_startup = subparsers.add_parser(
+        'startup', help='time from launch to the first processed frame')
+    parser_startup.add_argument('well', choices=sorted(STARTUP_STEPS))
+    parser_startup.add_argument(
+        'exp_path', help='camera folder for 16 well, '
+        'experiment folder for 32 and 96 well')
+    parser_startup.add_argument('-t', '--tc', type=int, default=45,
+                                help='total cycle. default is 45')
+    parser_startup.add_argument('-n', '--repeat', type=int, default=3,
+                                help='number of launches. default is 3')
+    parser_startup.set_defaults(func=bench_startup)
+    parser_imports = subparsers.add_parser(
+        'imports', help='import time budget of the datasheet modules')
+    parser_imports.add_argument('module', nargs='*',
+                                help='modules to check. default is all '
+                                'datasheet modules')
+    parser_imports.add_argument('-b', '--budget', type=float, default=1.0,
+                                help='seconds per module. default is 1.0')
+    parser_imports.add_argument('-n', '--repeat', type=int, default=3,
+                                help='number of launches. default is 3')
+    parser_imports.set_defaults(func=bench_imports)
+    parser_watch = subparsers.add_parser(
+        'watch', help='latency of the watch mode on a replayed run')
+    parser_watch.add_argument('well', choices=['16', '96'])
+    parser_watch.add_argument(
+        'exp_path', help='camera folder for 16 well, '
+        'experiment folder for 96 well, of a finished run')
+    parser_watch.add_argument('-t', '--tc', type=int, default=45,
+                              help='total cycle. default is 45')
+    parser_watch.add_argument('-d', '--dye_exempt', nargs='+',
+                              choices=['f', 'h', 'c', 'q6', 'q7'],
+                              help='notify missing dye')
+    parser_watch.add_argument('-c', '--cycle_sec', type=float, default=10.0,
+                              help='seconds per cycle. default is 10')
+    parser_watch.add_argument('-p', '--poll_sec', type=float, default=0.5,
+                              help='seconds between polls. default is 0.5')
+    parser_watch.set_defaults(func=bench_watch)
+    parser_morph = subparsers.add_parser(
+        'morph', help='opening and closing of the 32 and 96 well engines '
+        'against skimage')
+    parser_morph.add_argument('exp_path',
+                              help='experiment folder of 32 or 96 well')
+    parser_morph.add_argument('-f', '--frames', type=int, default=20,
+                              help='number of frames, spread over the run. '
+                              'default is 20')
+    parser_morph.set_defaults(func=bench_morph)
+    parser_synth = subparsers.add_parser(
+        'synth', help='write a synthetic run of an engine from the '
+        'dummy_data curves')
+    parser_synth.add_argument('engine', choices=list(SUITE_STEPS))
+    parser_synth.add_argument('out_path', help='new experiment folder')
+    parser_synth.add_argument('-t', '--tc', type=int, default=45,
+                              help='total cycle. default is 45')
+    parser_synth.set_defaults(func=bench_synth)
+    parser_suite = subparsers.add_parser(
+        'suite', help='frames/s, time by stage and peak RSS of every '
+        'engine on synthetic runs, against stored baselines')
+    parser_suite.add_argument('engine', nargs='*',
+                              help='engines to run, of {}. default is '
+                              'all'.format(', '.join(SUITE_STEPS)))
+    parser_suite.add_argument('-t', '--tc', type=int, default=5,
+                              help='total cycle. default is 5')
+    parser_suite.add_argument(
+        '-b', '--baseline', default=str(pathlib.Path(
+            __file__).resolve().parent/'bench_baseline.json'),
+        help='baseline file. default is bench_baseline.json next to '
+        'this script')
+    parser_suite.add_argument('-s', '--save', action='store_true',
+                              help='store the results as the baselines')
+    parser_suite.add_argument('-d', '--data',
+                              help='folder to keep the synthetic runs in '
+                              'and reuse them from. default is a temporary '
+                              'folder')
+    parser_suite.add_argument('-n', '--repeat', type=int, default=1,
+                              help='number of runs. default is 1')
+    parser_suite.add_argument('--tolerance', type=float, default=0.2,
+                              help='relative slowdown counted as a '
+                              'regression. default is 0.2')
+    parser_suite.set_defaults(func=bench_suite)
+    args = parser.parse_args()
+    args.func(args)
@@ -1,8 +1,6 @@
 from srt_rfu.srt_rfu32 import SrtRfu32
-import concurrent
+import abc
 import datetime
-from tqdm import tqdm
-import xlsxwriter
 import pandas as pd
 import numpy as np
 from collections import OrderedDict
@@ -10,7 +8,44 @@ from skimage.filters import threshold_mean
 from skimage.morphology import closing, opening, disk, erosion
 from skimage.segmentation import clear_border
 from skimage.measure import label
-from matplotlib import patches
+from srt_rfu.mp_pool import imap_tasks, map_tasks
+from srt_rfu import profiler
+from srt_rfu.profiler import stage
+from srt_rfu.running_stats import RunningStats, write_stats
+from srt_rfu.datasheet import (
+    copy_workbook, open_workbook, write_end_point, write_table)
+
+
+def get_rect_sums(im, rect_arr):
+    """
+    sums of an image over rectangles (y_min, x_min, y_max, x_max), max
+    excluded, summing any channel axis as well (ndarray of int64).
+    The image is reduced in one pass to the blocks between the rectangle
+    edges, and every rectangle is read off the summed-area table of the
+    blocks.
+    """
+    shape = im.shape[:2]
+    rect_arr = np.clip(rect_arr, 0, shape*2)
+    y_edge = np.unique(rect_arr[:, [0, 2]])
+    y_edge = y_edge[y_edge < shape[0]]
+    x_edge = np.unique(rect_arr[:, [1, 3]])
+    x_edge = x_edge[x_edge < shape[1]]
+    # rows are summed slab by slab, which numpy casts in small buffers;
+    # uint32 holds the column sums of any uint8 frame
+    dtype = np.uint32 if im.dtype == np.uint8 else np.int64
+    y_bound = list(y_edge) + [shape[0]]
+    block = np.array([im[y0:y1].sum(axis=0, dtype=dtype)
+                      for y0, y1 in zip(y_bound[:-1], y_bound[1:])],
+                     dtype=np.int64).reshape((len(y_edge),) + im.shape[1:])
+    # the last block of a row runs to the end of the image
+    block = np.add.reduceat(block, x_edge, axis=1)
+    block = block.sum(axis=tuple(range(2, block.ndim)))
+    table = np.zeros((len(y_edge)+1, len(x_edge)+1), dtype=np.int64)
+    table[1:, 1:] = block.cumsum(axis=0).cumsum(axis=1)
+    y_min, y_max = [np.searchsorted(y_edge, rect_arr[:, k]) for k in (0, 2)]
+    x_min, x_max = [np.searchsorted(x_edge, rect_arr[:, k]) for k in (1, 3)]
+    return (table[y_max, x_max] - table[y_min, x_max] -
+            table[y_max, x_min] + table[y_min, x_min])
 
 
 class ExpRfu(SrtRfu32):
@@ -25,6 +60,9 @@ class ExpRfu(SrtRfu32):
             datetime.datetime.now().strftime('%Y%m%d_%H%M%S'))
         self.folder_li = [i for i in self.exp_path.glob('*') if i.is_dir()]
         self.cam, self.col_li, self.row_li = self.get_well_loc(is_single=True)
+        # the grid does not depend on the image, so it is set once here and
+        # sent to the pool workers with the analyzer
+        self.grid = {self.cam: self.set_grid_single(None)}
 
     def run_datasheet_loop(self):
         im_path_li = []
@@ -36,58 +74,59 @@ class ExpRfu(SrtRfu32):
                     im_path_li.append(im_f.relative_to(self.exp_path))
                 for ch in self.ch_dict.values():
                     self.res_dic[folder.name][ch] = []
-        with concurrent.futures.ProcessPoolExecutor() as executor:
-            res_tup_li = list(
-                tqdm(executor.map(self.mp_rfu, im_path_li),
-                     total=len(im_path_li), desc='RFU table progress'))
+        self.im_path_li = im_path_li
+        rfu_li = map_tasks(self, 'mp_rfu',
+                           [(ind,) for ind in range(len(im_path_li))])
 
-        for rel_path, dic in res_tup_li:
+        for rel_path, dic in zip(im_path_li, rfu_li):
             f_name = rel_path.stem.split('_')
             self.res_dic[rel_path.parent.name][self.ch_dict[
                 f_name[0].lower()]].append(pd.Series(dic, name=f_name[1]))
 
-    def mp_rfu(self, im_rel_path):
-        im_path = self.exp_path/im_rel_path
-        self.grid = {}
-        self.grid[self.cam] = self.set_grid_single(im_path)
-
-        im_labeled, im_gray = self.label_image(im_path)
-        return im_rel_path, self.calculate_rfu(im_gray, self.cam)
-
-    def make_end_point_results(self, folder_name):
-        fname = '{}_{} -  End Point Results.xlsx'.format(
-            folder_name, self.version)
-        well_li = [
-            x+'0'+str(y) for x in self.row_name for y in range(
-                self.col_name[0][0], self.col_name[1][-1])][::-1]
-        with xlsxwriter.Workbook(str(self.res_dir/fname)) as writer:
-            ws = writer.add_worksheet()
-            ws.write(0, 1, 'Well')
-            ws.write(0, 3, 'Content')
-            for i, well in enumerate(well_li):
-                ws.write(i+1, 1, well)
-                ws.write(i+1, 3, 'Unkn')
+    def mp_rfu(self, im_ind):
+        "RFU by well of an image, its cells of the grid summed over RGB"
+        im_path = self.exp_path/self.im_path_li[im_ind]
+        return self.calculate_rfu(self.open_im(im_path), self.cam)
+
+    def get_end_point_well_li(self):
+        return [x+'0'+str(y) for x in self.row_name for y in range(
+            self.col_name[0][0], self.col_name[1][-1])][::-1]
 
     def get_datasheet(self):
         "save rfu table as xlsx for DSP analysis"
         self.run_datasheet_loop()
         self.res_dir.mkdir()
+        end_point_path_li = []
         for folder_name, dic1 in self.res_dic.items():
-            self.make_end_point_results(folder_name)
+            end_point_path_li.append(
+                self.res_dir/'{}_{} -  End Point Results.xlsx'.format(
+                    folder_name, self.version))
             fname = '{}_{} -  Quantitation Amplification Results.xlsx'.format(
                 folder_name, self.version)
-            with pd.ExcelWriter(str(self.res_dir/fname)) as writer:
+            with stage('Excel write'), open_workbook(
+                    self.res_dir/fname) as writer:
                 for dye, region_dic_li in dic1.items():
-                    df = pd.concat(region_dic_li, axis=1).T
-                    df.to_excel(writer, sheet_name=dye)
+                    col_li = list(region_dic_li[0].index) if (
+                        region_dic_li) else []
+                    write_table(writer.add_worksheet(dye),
+                                [s.name for s in region_dic_li], col_li,
+                                (s.reindex(col_li).tolist()
+                                 for s in region_dic_li))
+        if end_point_path_li:
+            write_end_point(end_point_path_li[0],
+                            self.get_end_point_well_li())
+            copy_workbook(end_point_path_li[0], end_point_path_li[1:])
 
     def label_image(self, im_path):
         im_cropped = self.open_im(im_path)
 
-        im_gray = im_cropped.sum(axis=2)
-        thresh = 0.1
-        threshed_im = im_gray > thresh
-        return label(threshed_im), im_gray
+        with stage('gray sum'):
+            im_gray = im_cropped.sum(axis=2)
+        with stage('threshold'):
+            thresh = 0.1
+            threshed_im = im_gray > thresh
+        with stage('label'):
+            return label(threshed_im), im_gray
     
     def set_grid_single(self, im_path, idx=0):
         well_box = [50, 200, 1300, 1500]
@@ -107,13 +146,15 @@ class ExpRfu(SrtRfu32):
         return grid
 
     def calculate_rfu(self, im_in, cam, ax=None):
-        "calculate RFU by image"
-        region_sum_dict = {}
-        for key, grid_coord in self.grid[cam].items():
-            x_range = slice(int(grid_coord[1]), int(grid_coord[3]))
-            y_range = slice(int(grid_coord[0]), int(grid_coord[2]))
-            region_sum_dict[key] = im_in[y_range, x_range].sum()
-        return region_sum_dict
+        """
+        calculate RFU by image: the sum of each grid cell of a gray image,
+        or of an RGB image over its channels too
+        """
+        with stage('mask sum'):
+            rect_arr = np.array([[int(val) for val in grid_coord]
+                                 for grid_coord in self.grid[cam].values()])
+            rfu_arr = get_rect_sums(im_in, rect_arr)
+        return dict(zip(self.grid[cam].keys(), rfu_arr.tolist()))
     
     def get_single_result(self):
         "save image processing result in image file (by cycle)"
@@ -133,7 +174,58 @@ class ExpRfu(SrtRfu32):
                                     outf_path, title)
 
 
+class ExpRfu2Base(ExpRfu, abc.ABC):
+    """
+    ExpRfu of a run whose images and their channels are listed by
+    get_im_ch_li, with one table by channel for the whole run, see
+    exp2rfu_v2 and exp2rfu_v3
+    """
+
+    @abc.abstractmethod
+    def get_im_ch_li(self):
+        "(path relative to exp_path, channel) of every image of the run"
+
+    def run_datasheet_loop(self):
+        im_ch_li = self.get_im_ch_li()
+        self.res_dic = OrderedDict()
+        self.res_dic[self.exp_path.name] = OrderedDict(
+            (ch, []) for _, ch in im_ch_li)
+        self.im_path_li = [rel_path for rel_path, _ in im_ch_li]
+        rfu_li = map_tasks(self, 'mp_rfu',
+                           [(ind,) for ind in range(len(im_ch_li))])
+
+        for (rel_path, ch), dic in zip(im_ch_li, rfu_li):
+            self.res_dic[self.exp_path.name][ch].append(
+                pd.Series(dic, name=rel_path.stem))
+
+    def mp_rfu_ch(self, im_ind):
+        "channel and RFU by well of an image, for results out of order"
+        return self.im_ch_li[im_ind][1], self.mp_rfu(im_ind)
+
+    def get_stats(self, stat_arg):
+        """
+        save a statistic of the RFU of each well by channel over all images,
+        reduced as the workers return them instead of kept in res_dic
+        """
+        self.im_ch_li = self.get_im_ch_li()
+        self.im_path_li = [rel_path for rel_path, _ in self.im_ch_li]
+        running_stats = RunningStats(
+            OrderedDict.fromkeys(ch for _, ch in self.im_ch_li),
+            self.grid[self.cam].keys())
+        for ch, dic in imap_tasks(
+                self, 'mp_rfu_ch',
+                [(ind,) for ind in range(len(self.im_ch_li))]):
+            running_stats.update(ch, dic)
+        self.res_dir.mkdir()
+        print(write_stats(
+            self.res_dir/'{}_{} - {} Results.xlsx'.format(
+                self.exp_path.name, self.version, stat_arg),
+            running_stats, stat_arg))
+
+
 def main(args):
+    if args.profile:
+        profiler.enable()
     print(args)
     print('path', args.exp_path)
     _rfu = ExpRfu(args.exp_path)
@@ -142,21 +234,25 @@ def main(args):
         _rfu.get_single_result()
     else:
         _rfu.get_datasheet()
+    if args.profile:
+        profiler.write_report(args.profile, args=vars(args))
 
 
 if __name__ == '__main__':
     import argparse
-    import subprocess
+    from srt_rfu.version import get_version
     parser = argparse.ArgumentParser(
         description='Convert image results from SRT to RFU formatted'
         'for DSP analysis')
-    version = subprocess.check_output(
-        ['git', 'rev-parse', '--short', 'HEAD']).decode('utf-8').strip()
+    version = get_version()
     parser.add_argument('-v', '--version', action='version', version=version)
     parser.add_argument(
         'exp_path', help='Path of the experiment directory, '
         'which contains main and sub folders for result images. '
         'If there are spaces within the path, add quotation marks.')
+    parser.add_argument('--profile', metavar='JSON',
+                        help='write the time and allocation of each stage '
+                        'of the run, workers included, to a JSON report')
     subparsers = parser.add_subparsers(
         title='onefile', dest='is_onefile',
         description='get image processing result from a file')
@@ -1,9 +1,13 @@
 import argparse
-import subprocess
 from srt_rfu.srt_rfu16_dev import SrtRfu16Dev
+from srt_rfu import profiler
+from srt_rfu.rfu_cache import RfuCache
+from srt_rfu.version import get_version
 
 
 def main(args):
+    if args.profile:
+        profiler.enable()
     print(args)
     print('path', args.exp_path)
     if args.tc:
@@ -11,20 +15,23 @@ def main(args):
         tc = int(args.tc)
     else:
         tc = 45
-    _rfu = SrtRfu16Dev(args.exp_path, args.dye_exempt)
+    _rfu = SrtRfu16Dev(args.exp_path, args.dye_exempt, luma=args.luma)
+    if args.cache:
+        _rfu.rfu_cache = RfuCache(args.cache, int(args.cache_gb * 2**30))
     if args.is_onefile == 's':
         print('is single file')
         _rfu.get_single_result(args.exp_path)
     else:
-        _rfu.get_datasheet(tc)
+        _rfu.get_datasheet(tc, batch=args.batch, watch=args.watch)
+    if args.profile:
+        profiler.write_report(args.profile, args=vars(args))
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         description='Convert image results from SRT to RFU formatted'
         'for DSP analysis')
-    version = subprocess.check_output(
-        ['git', 'rev-parse', '--short', 'HEAD']).decode('utf-8').strip()
+    version = get_version()
     parser.add_argument('-v', '--version', action='version', version=version)
     parser.add_argument(
         'exp_path', help='Path of the experiment directory, '
@@ -34,6 +41,20 @@ if __name__ == '__main__':
                         choices=['f', 'h', 'c', 'q6', 'q7'],
                         help='notify missing dye')
     parser.add_argument('-t', '--tc', help='add total cycle. default is 45')
+    parser.add_argument('--cache', help='directory of a frame result cache, '
+                        'so that frames analyzed before are not analyzed again')
+    parser.add_argument('--cache_gb', type=float, default=1.0,
+                        help='size cap of the cache in GB. default is 1')
+    parser.add_argument('-b', '--batch', action='store_true',
+                        help='process each cycle series as one block')
+    parser.add_argument('-l', '--luma', action='store_true',
+                        help='fast preview from the luma plane only, '
+                        'calibrated on the last cycle')
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help='process frames while the run is in progress')
+    parser.add_argument('--profile', metavar='JSON',
+                        help='write the time and allocation of each stage '
+                        'of the run, workers included, to a JSON report')
     subparsers = parser.add_subparsers(
         title='onefile', dest='is_onefile',
         description='get image processing result from a file')
@@ -1,6 +1,6 @@
 import argparse
-import subprocess
 from srt_rfu.srt_rfu16_legacy import SrtRfu16Leg
+from srt_rfu.version import get_version
 
 
 def main(args):
@@ -23,8 +23,7 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         description='Convert image results from SRT to RFU formatted'
         'for DSP analysis')
-    version = subprocess.check_output(
-        ['git', 'rev-parse', '--short', 'HEAD']).decode('utf-8').strip()
+    version = get_version()
     parser.add_argument('-v', '--version', action='version', version=version)
     parser.add_argument(
         'exp_path', help='Path of the experiment directory, '
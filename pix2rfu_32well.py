@@ -1,9 +1,13 @@
 import argparse
-import subprocess
 from srt_rfu.srt_rfu32 import SrtRfu32
+from srt_rfu import profiler
+from srt_rfu.rfu_cache import RfuCache
+from srt_rfu.version import get_version
 
 
 def main(args):
+    if args.profile:
+        profiler.enable()
     print(args)
     print('path', args.exp_path)
     print('except col', args.exempt_col)
@@ -14,6 +18,8 @@ def main(args):
     else:
         tc = 45
     _rfu = SrtRfu32(args.exp_path, args.dye_exempt)
+    if args.cache:
+        _rfu.rfu_cache = RfuCache(args.cache, int(args.cache_gb * 2**30))
     if args.is_onefile == 's':
         print('is single file')
         _rfu.get_single_result()
@@ -22,15 +28,16 @@ def main(args):
         _rfu.get_onef_result(
             args.temp, args.dye, args.cycle, args.well, tc=tc)
     else:
-        _rfu.get_datasheet(tc)
+        _rfu.get_datasheet(tc, fixed_mask=args.fixed_mask)
+    if args.profile:
+        profiler.write_report(args.profile, args=vars(args))
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         description='Convert image results from SRT to RFU formatted'
         'for DSP analysis')
-    version = subprocess.check_output(
-        ['git', 'rev-parse', '--short', 'HEAD']).decode('utf-8').strip()
+    version = get_version()
     parser.add_argument('-v', '--version', action='version', version=version)
     parser.add_argument(
         'exp_path', help='Path of the experiment directory, '
@@ -43,6 +50,17 @@ if __name__ == '__main__':
                         choices=['f', 'h', 'c', 'q6', 'q7'],
                         help='notify missing dye')
     parser.add_argument('-t', '--tc', help='add total cycle. default is 45')
+    parser.add_argument('--cache', help='directory of a frame result cache, '
+                        'so that frames analyzed before are not analyzed again')
+    parser.add_argument('--cache_gb', type=float, default=1.0,
+                        help='size cap of the cache in GB. default is 1')
+    parser.add_argument('-m', '--fixed_mask', action='store_true',
+                        help='segment only the last cycle of each dye and '
+                        'camera and sum every frame over its well masks. '
+                        'prints how far it drifts from full segmentation')
+    parser.add_argument('--profile', metavar='JSON',
+                        help='write the time and allocation of each stage '
+                        'of the run, workers included, to a JSON report')
     subparsers = parser.add_subparsers(
         title='onefile', dest='is_onefile',
         description='get image processing result from a file')
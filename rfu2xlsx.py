@@ -0,0 +1,40 @@
+import argparse
+import datetime
+import pathlib
+from srt_rfu.datasheet import RFU_CUBE_NAME, write_datasheets
+from srt_rfu.rfu_cube import RfuCube
+from srt_rfu.version import get_version
+
+
+def main(args):
+    print('path', args.cube_path)
+    cube_path = pathlib.Path(args.cube_path)
+    if cube_path.is_dir():
+        cube_path = cube_path/RFU_CUBE_NAME
+    rfu_cube = RfuCube.load(cube_path)
+    if args.out_path:
+        res_dir = pathlib.Path(args.out_path)
+    else:
+        res_dir = cube_path.parent/(
+            'DSP_datasheet' + datetime.datetime.now().strftime(
+                '_%y%m%d_%H%M%S'))
+    res_dir.mkdir(parents=True)
+    write_datasheets(rfu_cube, res_dir)
+    print('datasheets of {} saved in {}'.format(
+        rfu_cube.meta['exp_name'], res_dir))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Write the DSP datasheets of a run again from its saved '
+        'RFU, without image processing')
+    version = get_version()
+    parser.add_argument('-v', '--version', action='version', version=version)
+    parser.add_argument(
+        'cube_path', help='DSP_datasheet directory of the run, or the path '
+        'of its {}.npy'.format(RFU_CUBE_NAME))
+    parser.add_argument('-o', '--out_path',
+                        help='new directory for the datasheets. default is '
+                        'a time stamped DSP_datasheet next to the RFU')
+    args = parser.parse_args()
+    main(args)
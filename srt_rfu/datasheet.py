@@ -0,0 +1,108 @@
+import os
+import shutil
+import xlsxwriter
+from srt_rfu.mp_pool import map_tasks
+from srt_rfu.profiler import stage
+
+QUANT_SUFFIX = ' {} -  Quantitation Amplification Results.xlsx'
+END_POINT_SUFFIX = ' {} -  End Point Results.xlsx'
+# RfuCube.save name of the RFU of a run in its datasheet directory
+RFU_CUBE_NAME = 'rfu_cube'
+
+
+def open_workbook(path):
+    "xlsxwriter workbook that streams each row to disk once it is written"
+    return xlsxwriter.Workbook(str(path), {'constant_memory': True})
+
+
+def write_table(ws, index_li, col_li, row_li):
+    """
+    Write a table in the layout of DataFrame.to_excel: the column names
+    after an empty corner cell, then every row after its index label.
+    NaN values are left empty like pandas does. Rows have to come in order,
+    a constant memory worksheet only keeps the row being written.
+    @params:
+        ws          - Required  : xlsxwriter worksheet
+        index_li    - Required  : row labels (Iterable)
+        col_li      - Required  : column names (List)
+        row_li      - Required  : values by row, in col_li order (Iterable)
+    """
+    ws.write_row(0, 1, col_li)
+    for r, (index, row) in enumerate(zip(index_li, row_li), 1):
+        ws.write(r, 0, index)
+        ws.write_row(r, 1, [val if val == val else None for val in row])
+
+
+def write_quant_step(path, rfu_cube, step):
+    "Quantitation Amplification Results workbook of a step, a sheet by dye"
+    col_li = ['Cycle'] + rfu_cube.well_li
+    with stage('Excel write'), open_workbook(path) as writer:
+        for dye in rfu_cube.dye_li:
+            rfu = rfu_cube.loc(step, dye)
+            write_table(writer.add_worksheet(dye), range(len(rfu)), col_li,
+                        ([cycle] + row.tolist() for cycle, row in zip(
+                            rfu_cube.cycle_li, rfu)))
+
+
+def write_end_point(path, well_li):
+    "End Point Results workbook listing the wells as unknowns"
+    with stage('Excel write'), open_workbook(path) as writer:
+        ws = writer.add_worksheet()
+        ws.write(0, 1, 'Well')
+        ws.write(0, 3, 'Content')
+        for i, well in enumerate(well_li):
+            ws.write(i+1, 1, well)
+            ws.write(i+1, 3, 'Unkn')
+
+
+def copy_workbook(path, path_li):
+    "copy a written workbook to other paths instead of writing it again"
+    with stage('Excel write'):
+        for dst in path_li:
+            shutil.copyfile(str(path), str(dst))
+
+
+class QuantStepWriter:
+    """
+    Writes the Quantitation Amplification Results workbooks of a cube, one
+    task per step, for map_tasks. Forked workers share the cube's array.
+    """
+
+    def __init__(self, rfu_cube, path_li):
+        self.rfu_cube = rfu_cube
+        self.path_li = path_li
+
+    def write(self, step_ind):
+        write_quant_step(self.path_li[step_ind], self.rfu_cube,
+                         self.rfu_cube.step_li[step_ind])
+
+
+def write_datasheets(rfu_cube, res_dir, processes=None):
+    """
+    DSP datasheets of a run: a QuantStep folder by step with its
+    Quantitation Amplification and End Point workbooks.
+    Names come from rfu_cube.meta: 'exp_name', 'version', 'quant_step_li'
+    (folder by step) and 'end_point_well_li'.
+    Steps are written in parallel, the End Point workbook is the same for
+    every step and is written once.
+    """
+    meta = rfu_cube.meta
+    quant_path_li, end_point_path_li = [], []
+    for qs in meta['quant_step_li'][:len(rfu_cube.step_li)]:
+        qs_path = res_dir/qs
+        qs_path.mkdir()
+        quant_path_li.append(
+            qs_path/(meta['exp_name']+QUANT_SUFFIX.format(meta['version'])))
+        end_point_path_li.append(qs_path/(
+            meta['exp_name']+END_POINT_SUFFIX.format(meta['version'])))
+
+    write_end_point(end_point_path_li[0], meta['end_point_well_li'])
+    copy_workbook(end_point_path_li[0], end_point_path_li[1:])
+    writer = QuantStepWriter(rfu_cube, quant_path_li)
+    task_li = [(i,) for i in range(len(quant_path_li))]
+    processes = min(len(task_li), processes or os.cpu_count())
+    if processes > 1:
+        map_tasks(writer, 'write', task_li, 'Datasheet progress', processes)
+    else:
+        for task in task_li:
+            writer.write(*task)
@@ -0,0 +1,132 @@
+import numpy as np
+from PIL import Image
+from srt_rfu.profiler import stage
+
+
+def read_size(im_path):
+    "(height, width) of an image from its header, without decoding it"
+    with Image.open(str(im_path)) as im:
+        return im.size[::-1]
+
+
+# baseline and extended sequential frame headers, the ones decoded row by
+# row in a single scan
+SOF_MARKER_LI = [0xC0, 0xC1]
+# rows decoded past the last kept one, an MCU row, so that the chroma
+# upsampling of the kept rows sees the same neighbours as a full decode
+ROW_MARGIN = 16
+
+
+def get_scan_pos(data):
+    """
+    (position of the height field in the frame header, position of the
+    scan) of a JPEG stream, None when it is not a sequential frame or its
+    markers cannot be followed
+    """
+    pos = 2
+    height_pos = None
+    while pos + 4 <= len(data) and data[pos] == 0xFF:
+        marker = data[pos+1]
+        if marker in SOF_MARKER_LI:
+            height_pos = pos + 5
+        elif marker == 0xDA:
+            return None if height_pos is None else (height_pos, pos)
+        elif marker in (0xC2, 0xD9):
+            return None
+        pos += 2 + (data[pos+2] << 8 | data[pos+3])
+    return None
+
+
+def decode_rows(im, im_path, n_row):
+    """
+    The first n_row rows of an opened JPEG image (PIL Image), decoded by
+    driving its decoder on the stream with the frame height of the header
+    lowered to n_row. libjpeg then stops decoding there but still reads the
+    rest of the stream up to its end marker, so a corrupt stream fails like
+    in a full decode.
+    libjpeg waits for more data instead of failing on a short stream, which
+    PIL reports as done, so a stream without an end marker after its scan
+    is left to the full decode, which raises on it.
+    Returns None when the stream is not supported or fails to decode, and
+    when the PIL decoder internals it relies on differ from those of PIL
+    6.0 to 12.
+    """
+    getdecoder = getattr(Image, '_getdecoder', None)
+    if getdecoder is None or len(im.tile) != 1:
+        return None
+    decoder_name, _, offset, args = im.tile[0]
+    with open(str(im_path), 'rb') as f:
+        data = bytearray(f.read())
+    scan_pos = get_scan_pos(data)
+    if decoder_name != 'jpeg' or offset != 0 or scan_pos is None:
+        return None
+    height_pos, sos_pos = scan_pos
+    # inside the scan, 0xFF is followed by 0x00 or a restart marker only
+    if data.find(b'\xff\xd9', sos_pos) < 0:
+        return None
+    data[height_pos:height_pos+2] = n_row.to_bytes(2, 'big')
+    out = Image.new(im.mode, (im.size[0], n_row))
+    try:
+        decoder = getdecoder(im.mode, decoder_name, args,
+                             getattr(im, 'decoderconfig', ()))
+        decoder.setimage(out.im, (0, 0, im.size[0], n_row))
+    except (AttributeError, TypeError, ValueError, OSError):
+        return None
+    try:
+        buf = bytes(data)
+        while buf:
+            n, err = decoder.decode(buf)
+            if n < 0:
+                return out if err >= 0 else None
+            if n == 0:
+                return None
+            buf = buf[n:]
+    finally:
+        decoder.cleanup()
+    return None
+
+
+def open_roi(im_path, y_range=slice(None), x_range=slice(None),
+             luma=False):
+    """
+    Decode only the region of an image needed for the analysis.
+    Equivalent to np.array(Image.open(im_path))[y_range, x_range]
+    @params:
+        im_path     - Required  : path of the image (Str or Path)
+        y_range     - Optional  : rows to keep (slice with step 1)
+        x_range     - Optional  : columns to keep (slice with step 1)
+        luma        - Optional  : decode the luma plane only (Bool)
+
+    The crop is taken by PIL before the array conversion, so the full frame
+    is never copied into numpy. Sequential JPEG frames are also decoded only
+    down to a margin past the last needed row, see decode_rows, so the kept
+    rows are bit-identical to a full decode. Any other frame, or one that
+    fails there, is decoded in full as usual.
+
+    With `luma`, JPEG frames skip chroma decoding and YCbCr to RGB
+    conversion and a 2D uint8 array of the Y plane is returned.
+    """
+    with stage('decode'):
+        im = Image.open(str(im_path))
+        if luma:
+            if im.format == 'JPEG':
+                im.draft('L', im.size)
+            else:
+                im = im.convert('L')
+        width, height = im.size
+        y_start, y_stop, _ = y_range.indices(height)
+        x_start, x_stop, _ = x_range.indices(width)
+        y_stop = max(y_start, y_stop)
+        x_stop = max(x_start, x_stop)
+
+        n_row = y_stop + ROW_MARGIN
+        part = None
+        if (im.format == 'JPEG' and not im.info.get('progressive') and
+                0 < y_stop and n_row < height):
+            part = decode_rows(im, im_path, n_row)
+        if part is None:
+            im.load()
+        else:
+            im = part
+    with stage('crop'):
+        return np.array(im.crop((x_start, y_start, x_stop, y_stop)))
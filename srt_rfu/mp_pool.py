@@ -0,0 +1,95 @@
+import multiprocessing
+import os
+import numpy as np
+from tqdm import tqdm
+from srt_rfu import profiler
+
+# bound analyzer method of this worker process, set once by init_worker
+_worker = {}
+
+
+def make_shared_array(shape):
+    """
+    Zero filled float64 array in shared memory.
+    Returns the buffer to hand to map_tasks and an array view of it.
+    """
+    shared = (multiprocessing.RawArray('d', int(np.prod(shape))),
+              tuple(shape))
+    return shared, as_array(shared)
+
+
+def as_array(shared):
+    raw, shape = shared
+    return np.frombuffer(raw, dtype=np.float64).reshape(shape)
+
+
+def init_worker(analyzer, method_name, shared=None, profile_queue=None):
+    for name, buf in (shared or {}).items():
+        setattr(analyzer, name, as_array(buf))
+    _worker['func'] = getattr(analyzer, method_name)
+    _worker['profile'] = profile_queue is not None
+    if profile_queue is not None:
+        profiler.enable_worker(profile_queue)
+
+
+def call_worker(task):
+    result = _worker['func'](*task)
+    if _worker['profile']:
+        profiler.send_task_stages(result)
+    return result
+
+
+def get_chunksize(n_task, n_proc):
+    "about four chunks per worker keeps the load balanced at the tail"
+    return max(1, n_task // (n_proc * 4))
+
+
+def map_tasks(analyzer, method_name, task_li, desc='RFU table progress',
+              processes=None, shared=None):
+    """
+    Run analyzer.<method_name>(*task) for every task in a process pool.
+    The analyzer is sent once per worker by the pool initializer instead of
+    being pickled with every task, so tasks stay small tuples of ints.
+    @params:
+        analyzer    - Required  : object holding the config and grid
+        method_name - Required  : name of the method to call (Str)
+        task_li     - Required  : argument tuples, one per task (List)
+        desc        - Optional  : progress bar text (Str)
+        processes   - Optional  : number of workers (Int)
+        shared      - Optional  : buffers from make_shared_array by
+                                  attribute name, set on the workers'
+                                  analyzer as arrays (Dict)
+    Returns the results in the order of task_li.
+    """
+    processes = processes or os.cpu_count()
+    chunksize = get_chunksize(len(task_li), processes)
+    with start_pool(analyzer, method_name, processes, shared) as pool:
+        return list(tqdm(pool.imap(call_worker, task_li, chunksize),
+                         total=len(task_li), desc=desc))
+
+
+def imap_tasks(analyzer, method_name, task_li, desc='RFU table progress',
+               processes=None, shared=None):
+    """
+    map_tasks yielding each result as soon as a worker returns it, in the
+    order they finish, so that the caller can reduce them without keeping
+    them all. Results have to tell which task they belong to.
+    """
+    processes = processes or os.cpu_count()
+    chunksize = get_chunksize(len(task_li), processes)
+    with start_pool(analyzer, method_name, processes, shared) as pool:
+        for result in tqdm(
+                pool.imap_unordered(call_worker, task_li, chunksize),
+                total=len(task_li), desc=desc):
+            yield result
+
+
+def start_pool(analyzer, method_name, processes=None, shared=None):
+    """
+    pool whose workers run call_worker tasks on the analyzer, see map_tasks.
+    When the run is profiled, workers send their stages to the parent's
+    profiler.
+    """
+    return multiprocessing.Pool(
+        processes or os.cpu_count(), init_worker,
+        (analyzer, method_name, shared, profiler.get_worker_queue()))
@@ -0,0 +1,212 @@
+import json
+import multiprocessing
+import pickle
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+
+# profiler of this process, set by enable or enable_worker
+_state = {'profiler': None}
+
+
+class NullStage:
+    "stage of a run that is not profiled"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+class Stage:
+    """
+    Wall time and allocation of one pass through a stage, see
+    Profiler.stage. Allocation is the traced memory left allocated and the
+    peak over the stage, both above the traced memory at its start. An
+    enclosing stage still sees the peak of the stages inside it. Python
+    before 3.9 cannot reset the tracemalloc peak, so there peaks are those
+    of the process so far.
+    """
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        stack = self.profiler.stack
+        cur, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, peak)
+        reset_peak()
+        self.start_mem = cur
+        self.peak = cur
+        stack.append(self)
+        self.t = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        sec = time.perf_counter() - self.t
+        stack = self.profiler.stack
+        stack.pop()
+        cur, peak = tracemalloc.get_traced_memory()
+        peak = max(self.peak, peak)
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, peak)
+        reset_peak()
+        self.profiler.add(self.name, 1, sec, sec, cur - self.start_mem,
+                          peak - self.start_mem)
+        return False
+
+
+def reset_peak():
+    "tracemalloc.reset_peak where there is one, Python 3.9 and later"
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+
+
+class Profiler:
+    """
+    Wall time and tracemalloc allocation of the named stages of a run,
+    aggregated over its frames.
+    Pool workers profile into a Profiler of their own, which sends the
+    stages of each task to the parent's queue, see enable_worker.
+    Stages by name hold [count, total sec, max sec, net bytes, peak bytes].
+    """
+
+    def __init__(self):
+        self.stage_dict = OrderedDict()
+        self.stack = []
+        self.lock = threading.Lock()
+        self.queue = None
+        self.reader = None
+        self.t = time.time()
+
+    def stage(self, name):
+        return Stage(self, name)
+
+    def add(self, name, count, sec, max_sec, alloc, peak):
+        with self.lock:
+            stats = self.stage_dict.setdefault(name, [0, 0.0, 0.0, 0, 0])
+            stats[0] += count
+            stats[1] += sec
+            stats[2] = max(stats[2], max_sec)
+            stats[3] += alloc
+            stats[4] = max(stats[4], peak)
+
+    def merge(self, stage_dict):
+        for name, stats in stage_dict.items():
+            self.add(name, *stats)
+
+    def pop_stage_dict(self):
+        with self.lock:
+            stage_dict, self.stage_dict = self.stage_dict, OrderedDict()
+        return stage_dict
+
+    def get_queue(self):
+        """
+        queue the pool workers send their stages to, read into this
+        profiler by a thread until close_queue
+        """
+        if self.queue is None:
+            self.queue = multiprocessing.SimpleQueue()
+            self.reader = threading.Thread(target=self.read_queue)
+            self.reader.daemon = True
+            self.reader.start()
+        return self.queue
+
+    def read_queue(self):
+        for stage_dict in iter(self.queue.get, None):
+            self.merge(stage_dict)
+
+    def close_queue(self):
+        "wait until the stages workers sent so far are read"
+        if self.queue is not None:
+            self.queue.put(None)
+            self.reader.join()
+            self.queue = None
+
+    def get_report(self):
+        "stages of the run by name, in the order they first ran (Dict)"
+        self.close_queue()
+        stage_report = OrderedDict()
+        for name, (count, sec, max_sec, alloc, peak) in (
+                self.stage_dict.items()):
+            stage_report[name] = OrderedDict([
+                ('count', count), ('total_sec', sec),
+                ('mean_sec', sec/count), ('max_sec', max_sec),
+                ('alloc_mb', alloc/2**20), ('peak_mb', peak/2**20)])
+        return OrderedDict([('wall_sec', time.time() - self.t),
+                            ('stages', stage_report)])
+
+
+def enable():
+    """
+    profile the stages of this run, with tracemalloc tracing from now on.
+    Returns the profiler.
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _state['profiler'] = Profiler()
+    return _state['profiler']
+
+
+def enable_worker(queue):
+    "profile the tasks of a pool worker into the parent's queue"
+    enable().queue = queue
+
+
+def get_profiler():
+    "profiler of this process, None when the run is not profiled"
+    return _state['profiler']
+
+
+def stage(name):
+    """
+    context manager timing a stage of the run when it is profiled, and
+    doing nothing otherwise
+    """
+    profiler = _state['profiler']
+    if profiler is None:
+        return NULL_STAGE
+    return profiler.stage(name)
+
+
+def get_worker_queue():
+    "queue for the initializer of a pool, None when the run is not profiled"
+    profiler = _state['profiler']
+    return None if profiler is None else profiler.get_queue()
+
+
+def send_task_stages(result):
+    """
+    after a worker task: time the pickling of its result, which the pool
+    does next to send it, and send the stages of the task to the parent
+    """
+    profiler = _state['profiler']
+    with profiler.stage('result IPC'):
+        pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+    profiler.queue.put(profiler.pop_stage_dict())
+
+
+def write_report(path, **meta):
+    """
+    write the profile of the run as JSON, with meta entries first, and
+    print its stages
+    """
+    report = OrderedDict(meta)
+    report.update(_state['profiler'].get_report())
+    with open(str(path), 'w') as f:
+        json.dump(report, f, indent=2)
+    print('{:<16}{:>8}{:>12}{:>12}{:>12}{:>12}'.format(
+        'stage', 'count', 'total sec', 'mean ms', 'alloc MB', 'peak MB'))
+    for name, stats in report['stages'].items():
+        print('{:<16}{:>8}{:>12.3f}{:>12.3f}{:>12.1f}{:>12.1f}'.format(
+            name, stats['count'], stats['total_sec'],
+            stats['mean_sec']*1000, stats['alloc_mb'], stats['peak_mb']))
+    print('profile of {:.3f} sec saved in {}'.format(
+        report['wall_sec'], path))
@@ -0,0 +1,42 @@
+"""
+QC plots of the image processing results.
+The analyzers import this module only when they plot, so datasheet runs and
+pool workers never load matplotlib.
+"""
+import matplotlib
+import matplotlib.pyplot as plt
+from matplotlib import patches
+from skimage.color import label2rgb
+import numpy as np
+from srt_rfu.heat_map import heatmap, annotate_heatmap
+
+# label colors of the labeled image overlays
+COLORS_LI = [plt.cm.get_cmap('hsv', 30)(i) for i in range(30)]
+
+
+def label_overlay(im_labeled):
+    return label2rgb(im_labeled, bg_label=0, colors=COLORS_LI)
+
+
+def well_circle(center, radius):
+    return patches.Circle(center, radius=radius, color='r', fill=False,
+                          linewidth=1)
+
+
+def crop_rect(x_range, y_range):
+    "outline of the analyzed region on the original image"
+    return patches.Rectangle(
+        (x_range.start, y_range.start), x_range.stop-x_range.start,
+        y_range.stop-y_range.start, edgecolor='r', facecolor='none')
+
+
+def plot_ratio_heatmap(table_cell, row_li, col_li, ax):
+    "heatmap of the RFU by well divided by the mean RFU"
+    cell_np = np.array(table_cell)
+    data_rt_mean = np.true_divide(cell_np, np.mean(cell_np))
+    boundary = [0, 0.5, 0.7, 0.9, 1.1, 1.3, 1.5, 2]
+    norm = matplotlib.colors.BoundaryNorm(boundary, 7)
+    im, cbar = heatmap(data_rt_mean, row_li, col_li, ax=ax,
+                       cmap=plt.get_cmap('coolwarm', 7), norm=norm,
+                       cbarlabel='RFU divided by mean')
+    annotate_heatmap(im, textcolors=['black', 'black'])
@@ -0,0 +1,59 @@
+import numpy as np
+from scipy import ndimage
+from srt_rfu.profiler import stage
+
+
+class RegionStats:
+    """
+    Area, centroid, intensity sum and bounding box of every labeled region
+    of a frame as compact arrays, in place of a regionprops object and its
+    sub-images per region.
+    ndimage.find_objects gives all bounding boxes in one pass, then each
+    region is reduced over its box only: pixel count and pixel counts by row
+    and column, whose dot products with the coordinates are the exact
+    integer sums of the centroid.
+    Regions are sorted by descending area, ties in label order, like
+    get_region_li sorted regionprops. Values are those of regionprops:
+    centroid in (row, col), bbox in (min_row, min_col, max_row, max_col)
+    with the max excluded.
+    @params:
+        im_labeled  - Required  : label image, 0 for the background (ndarray)
+        im_gray     - Required  : intensity image of the same shape (ndarray)
+    """
+
+    def __init__(self, im_labeled, im_gray):
+        with stage('regionprops'):
+            self.set_stats(im_labeled, im_gray)
+
+    def set_stats(self, im_labeled, im_gray):
+        im_gray = np.asarray(im_gray)
+        label_li, bbox_li, sum_li = [], [], []
+        for ind, sl in enumerate(ndimage.find_objects(im_labeled)):
+            if sl is None:
+                continue
+            mask = im_labeled[sl] == ind + 1
+            row_count = mask.sum(axis=1)
+            col_count = mask.sum(axis=0)
+            label_li.append(ind + 1)
+            bbox_li.append((sl[0].start, sl[1].start, sl[0].stop, sl[1].stop))
+            sum_li.append((
+                row_count.sum(),
+                row_count.dot(np.arange(sl[0].start, sl[0].stop)),
+                col_count.dot(np.arange(sl[1].start, sl[1].stop)),
+                im_gray[sl][mask].sum()))
+
+        sum_arr = np.array(sum_li, dtype=np.float64).reshape(-1, 4)
+        order = np.argsort(-sum_arr[:, 0], kind='mergesort')
+        sum_arr = sum_arr[order]
+        self.label = np.array(label_li, dtype=np.intp)[order]
+        self.bbox = np.array(bbox_li, dtype=np.intp).reshape(-1, 4)[order]
+        self.area = sum_arr[:, 0]
+        self.centroid = sum_arr[:, 1:3]/self.area[:, None]
+        self.intensity_sum = sum_arr[:, 3]
+
+    def __len__(self):
+        return len(self.label)
+
+    def to_array(self):
+        "(area, centroid y, centroid x, intensity sum) rows, an (n, 4) array"
+        return np.column_stack([self.area, self.centroid, self.intensity_sum])
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import pathlib
+import numpy as np
+
+
+class RfuCache:
+    """
+    On-disk cache of per-frame analysis results, shared by runs and
+    processes. Entries are keyed by the sha1 of the frame bytes and of the
+    parameters the result depends on (engine, algorithm version, grid,
+    crop ranges, ...), so a frame is only analyzed again when its content
+    or one of those parameters changes.
+    The cache is held under `max_bytes` by evicting the least recently used
+    entries.
+    @params:
+        cache_dir   - Required  : directory of the cache (Str or Path)
+        max_bytes   - Optional  : size cap of the cache in bytes (Int)
+    """
+
+    def __init__(self, cache_dir, max_bytes=1 << 30):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        # estimate of the size on disk; other processes write too, so it
+        # is only trusted to decide when to rescan the directory
+        self.n_bytes = sum(size for _, size, _ in self.get_entry_li())
+
+    def get_key(self, im_path, params):
+        "content hash of the frame and the parameters of its analysis"
+        digest = hashlib.sha1()
+        with open(str(im_path), 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get_path(self, key):
+        return self.cache_dir/key[:2]/'{}.npy'.format(key)
+
+    def get(self, key):
+        "cached array of a key, or None"
+        path = self.get_path(key)
+        try:
+            arr = np.load(str(path))
+            os.utime(str(path))
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        return arr
+
+    def put(self, key, arr):
+        path = self.get_path(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_name('{}.{}.tmp'.format(path.stem, os.getpid()))
+        with open(str(tmp_path), 'wb') as f:
+            np.save(f, arr)
+        os.replace(str(tmp_path), str(path))
+        self.n_bytes += path.stat().st_size
+        if self.n_bytes > self.max_bytes:
+            self.evict()
+
+    def get_or_compute(self, im_path, params, compute):
+        """
+        Result of `compute(im_path)` for a frame, an ndarray, taken from the
+        cache when the frame was analyzed with the same params before.
+        """
+        key = self.get_key(im_path, params)
+        arr = self.get(key)
+        if arr is None:
+            arr = np.asarray(compute(im_path))
+            self.put(key, arr)
+        return arr
+
+    def get_entry_li(self):
+        "(path, size, last use) of every entry"
+        entry_li = []
+        for path in self.cache_dir.glob('*/*.npy'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entry_li.append((path, stat.st_size, stat.st_mtime))
+        return entry_li
+
+    def evict(self):
+        "remove the least recently used entries down to 90% of the cap"
+        entry_li = sorted(self.get_entry_li(), key=lambda entry: entry[2])
+        self.n_bytes = sum(size for _, size, _ in entry_li)
+        for path, size, _ in entry_li:
+            if self.n_bytes <= self.max_bytes * 0.9:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            self.n_bytes -= size
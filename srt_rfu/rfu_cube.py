@@ -0,0 +1,135 @@
+import json
+import os
+import pathlib
+import numpy as np
+import pandas as pd
+
+
+class RfuCube:
+    """
+    RFU of a run in one ndarray with named axes (step, dye, cycle, well).
+    Steps are the temperature steps ('Low Temp', ...) or QuantSteps, dyes the
+    dye names and cycles the 1-based cycle numbers.
+    `meta` holds what the datasheets need besides the RFU, e.g. the
+    experiment name and version, and is saved with the cube.
+    """
+    axes = ('step', 'dye', 'cycle', 'well')
+
+    def __init__(self, step_li, dye_li, cycle_li, well_li, data=None,
+                 dtype=np.float32):
+        self.labels = [list(step_li), list(dye_li), list(cycle_li),
+                       list(well_li)]
+        self.index = [{label: i for i, label in enumerate(label_li)}
+                      for label_li in self.labels]
+        shape = tuple(len(label_li) for label_li in self.labels)
+        if data is None:
+            data = np.zeros(shape, dtype=dtype)
+        elif data.shape != shape:
+            raise ValueError('data of shape {} does not match axes {}'.format(
+                data.shape, shape))
+        self.data = data
+        self.meta = {}
+
+    @property
+    def step_li(self):
+        return self.labels[0]
+
+    @property
+    def dye_li(self):
+        return self.labels[1]
+
+    @property
+    def cycle_li(self):
+        return self.labels[2]
+
+    @property
+    def well_li(self):
+        return self.labels[3]
+
+    def get_index(self, axis, label):
+        "position(s) of label(s) on an axis; None selects the whole axis"
+        ind = self.axes.index(axis)
+        if label is None:
+            return slice(None)
+        if isinstance(label, (list, tuple)):
+            return [self.index[ind][i] for i in label]
+        return self.index[ind][label]
+
+    def loc(self, step=None, dye=None, cycle=None, well=None):
+        """
+        Select by labels. A single label drops its axis, a list keeps it.
+        Single labels and whole axes give a view, lists give a copy.
+        """
+        key = [self.get_index(axis, label) for axis, label in zip(
+            self.axes, [step, dye, cycle, well])]
+        sel = self.data
+        # index list axes one at a time, numpy would broadcast them together
+        for pos in reversed(range(len(key))):
+            if isinstance(key[pos], list):
+                sel = np.take(sel, key[pos], axis=pos)
+                key[pos] = slice(None)
+        return sel[tuple(key)]
+
+    @classmethod
+    def assemble(cls, cube_li, dtype=None):
+        "join cubes of different wells, e.g. camera blocks, into a plate"
+        first = cube_li[0]
+        well_li = [well for cube in cube_li for well in cube.well_li]
+        plate = cls(first.step_li, first.dye_li, first.cycle_li, well_li,
+                    dtype=dtype or first.data.dtype)
+        start = 0
+        for cube in cube_li:
+            stop = start + len(cube.well_li)
+            plate.data[..., start:stop] = cube.loc(
+                first.step_li, first.dye_li, first.cycle_li)
+            start = stop
+        return plate
+
+    def to_frame(self, step, dye):
+        "table of cycle by well, as written to the datasheets"
+        return pd.DataFrame(self.loc(step, dye), index=self.cycle_li,
+                            columns=self.well_li)
+
+    def to_rfu_dict(self):
+        "rfu_dict[step][dye] tables for the Excel writers"
+        rfu_dict = {}
+        for step in self.step_li:
+            rfu_dict[step] = {}
+            for dye in self.dye_li:
+                rfu_dict[step][dye] = self.to_frame(step, dye)
+        return rfu_dict
+
+    def save(self, path):
+        """
+        Save as <path>.npy, the raw array, and <path>.json, the labels and
+        meta. The .npy can be memory-mapped by load.
+        Both files are written through temp files and renamed into place.
+        """
+        path = pathlib.Path(path)
+        sidecar = {'axes': list(self.axes), 'labels': self.labels,
+                   'meta': self.meta}
+        for suffix, write in [
+                ('.npy', lambda f: np.save(f, self.data)),
+                ('.json', lambda f: f.write(json.dumps(
+                    sidecar, indent=1).encode('utf-8')))]:
+            tmp_path = path.with_name(path.name + suffix + '.tmp')
+            with open(str(tmp_path), 'wb') as f:
+                write(f)
+            os.replace(str(tmp_path), str(path.with_name(path.name+suffix)))
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Cube saved by save. With the default mmap_mode the array is mapped
+        read-only instead of read, so opening a run costs no RFU I/O.
+        """
+        path = pathlib.Path(path)
+        if path.suffix in ('.npy', '.json'):
+            path = path.with_suffix('')
+        with open(str(path.with_name(path.name+'.json'))) as f:
+            sidecar = json.load(f)
+        data = np.load(str(path.with_name(path.name+'.npy')),
+                       mmap_mode=mmap_mode)
+        cube = cls(*sidecar['labels'], data=data)
+        cube.meta = sidecar['meta']
+        return cube
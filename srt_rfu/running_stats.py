@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+from srt_rfu.datasheet import open_workbook, write_table
+from srt_rfu.profiler import stage
+
+STAT_LI = ['mean', 'mean_ratio', 'std', 'cv']
+
+
+class RunningStats:
+    """
+    Mean and variance of the RFU of each well by channel over the images of
+    a run, updated one image at a time by Welford's online algorithm, so
+    that memory does not grow with the number of images.
+    @params:
+        ch_li       - Required  : channels (Iterable)
+        well_li     - Required  : wells (Iterable)
+    """
+
+    def __init__(self, ch_li, well_li):
+        self.ch_li = list(ch_li)
+        self.well_li = list(well_li)
+        self.ch_ind = {ch: ind for ind, ch in enumerate(self.ch_li)}
+        shape = (len(self.ch_li), len(self.well_li))
+        self.count = np.zeros((len(self.ch_li), 1), dtype=np.int64)
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+
+    def update(self, ch, rfu_dic):
+        "add the RFU by well of an image of a channel (Dict)"
+        val_arr = np.array([rfu_dic[well] for well in self.well_li],
+                           dtype=np.float64)
+        ind = self.ch_ind[ch]
+        self.count[ind] += 1
+        delta = val_arr - self.mean[ind]
+        self.mean[ind] += delta/self.count[ind]
+        self.m2[ind] += delta*(val_arr - self.mean[ind])
+
+    def get_std(self):
+        "sample standard deviation like pandas, NaN below two images"
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.count > 1,
+                            np.sqrt(self.m2/(self.count - 1)), np.nan)
+
+    def get_stat(self, stat):
+        """
+        statistic of every well by channel (DataFrame).
+        mean_ratio is the mean of a well over the mean of all wells of its
+        channel, cv is the standard deviation over the mean.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(self.count > 0, self.mean, np.nan)
+            if stat == 'mean':
+                arr = mean
+            elif stat == 'mean_ratio':
+                arr = mean/mean.mean(axis=1, keepdims=True)
+            elif stat == 'std':
+                arr = self.get_std()
+            elif stat == 'cv':
+                arr = self.get_std()/mean
+            else:
+                raise ValueError('Unknown statistic {}, expected one of '
+                                 '{}'.format(stat, STAT_LI))
+        return pd.DataFrame(arr, index=self.ch_li, columns=self.well_li)
+
+
+def write_stats(path, running_stats, stat):
+    "workbook of a statistic, a row by channel and a column by well"
+    df = running_stats.get_stat(stat)
+    with stage('Excel write'), open_workbook(path) as writer:
+        write_table(writer.add_worksheet(stat), df.index, list(df.columns),
+                    (row.tolist() for row in df.values))
+    return df
@@ -1,33 +1,73 @@
-import subprocess
+import hashlib
+import os
 import pathlib
 from collections import OrderedDict
 from skimage.filters import threshold_mean
-from skimage.measure import regionprops, label
+from skimage.measure import label
 from skimage.segmentation import clear_border
 import numpy as np
-from PIL import Image
-import matplotlib.pyplot as plt
+from scipy import sparse
+from srt_rfu.im_loader import open_roi, read_size
+from srt_rfu.profiler import stage
+from srt_rfu.region_stats import RegionStats
+from srt_rfu.version import get_version
 import json
 import time
 
+# well index by (image shape, grid); kept per process so that pickled
+# analyzer copies sent to pool workers share it across frames
+_well_index_cache = {}
+
+# grid by camera directory, checked against grid.json mtime and content hash
+_grid_cache = {}
+
+
+def load_grid_json(cam_dir):
+    """grid centers of a camera from its grid.json, cached per process
+
+    The file is only read again when its mtime changes, and the grid is only
+    replaced when its content hash changes too.
+    Returns the cache entry with 'grid_cent', 'hash' and 'mtime'.
+    """
+    grid_path = pathlib.Path(cam_dir)/'grid.json'
+    mtime = os.stat(str(grid_path)).st_mtime_ns
+    entry = _grid_cache.get(grid_path.parent)
+    if entry is None or entry['mtime'] != mtime:
+        raw = grid_path.read_bytes()
+        digest = hashlib.sha1(raw).hexdigest()
+        if entry is None or entry['hash'] != digest:
+            entry = {'grid_cent': json.loads(raw.decode('utf-8')),
+                     'hash': digest}
+        entry['mtime'] = mtime
+        _grid_cache[grid_path.parent] = entry
+    return entry
+
+
+def dump_grid_json(cam_dir, grid_cent):
+    """write grid.json atomically, so that a concurrent reader never sees a
+    partial file and concurrent writers do not interleave"""
+    grid_path = pathlib.Path(cam_dir)/'grid.json'
+    tmp_path = grid_path.with_name('grid.json.{}.tmp'.format(os.getpid()))
+    with open(str(tmp_path), 'w') as f:
+        json.dump(grid_cent, f)
+    os.replace(str(tmp_path), str(grid_path))
+
 
 class SrtRfu16:
+    # bump when a change alters the well sums, so that RfuCache entries of
+    # the old algorithm are not used
+    ALGORITHM_VERSION = 1
+
     def __init__(self):
         self.temp_li = ['Low Temp', 'High Temp']
         self.grid_cent = None
+        self.grid_dir = None
         self.row_name = list('ABCD')
         self.col_name = range(1, 5)
         self.radius = 100
-        self.version = subprocess.check_output(
-            ['git', 'rev-parse', '--short', 'HEAD']).decode('utf-8').strip()
-
-    def get_region_li(self, im_labeled, im_gray):
-        region_li = []
-        for region in regionprops(im_labeled, intensity_image=im_gray):
-            region_li.append((region.area, region))
-        sorted_region_li = sorted(
-            region_li, key=lambda tup: tup[0], reverse=True)
-        return [region for area, region in sorted_region_li]
+        self.luma = False
+        self.rfu_cache = None
+        self.version = get_version()
 
     def get_grid_center(self):
         self.grid_cent = {}
@@ -43,53 +83,155 @@ class SrtRfu16:
         mask = dist_from_center <= self.radius
         return mask
 
-    def calculate_rfu(self, im):
-        "calculate RFU by image"
-        im_sum = im.sum(axis=2)
+    def get_grid_key(self, shape):
+        return (tuple(shape), self.radius, tuple(
+            (well, tuple(cent)) for well, cent in self.grid_cent.items()))
 
-        region_sum_dict = {}
-        for well, cent in self.grid_cent.items():
-            y_start = int(cent[1]-self.radius)
-            y_end = int(cent[1]+self.radius)
-            x_start = int(cent[0]-self.radius)
-            x_end = int(cent[0]+self.radius)
-            im_cropped = im_sum[y_start:y_end, x_start:x_end]
-            h, w = im_cropped.shape
-
-            mask = self.create_circular_mask(h, w)
-            masked_img = im_cropped.copy()
-            masked_img[~mask] = 0
-            region_sum_dict[well] = int(masked_img.sum())
+    def get_well_index(self, shape):
+        """pixel coordinates and well ids of every circular well mask
+
+        Built once per grid and image shape and reused for every frame.
+        Crops follow the same slicing as a per-well crop of an image of
+        `shape`, so the pixels are identical to masking each crop.
+        """
+        key = self.get_grid_key(shape)
+        if key in _well_index_cache:
+            return _well_index_cache[key]
+        h_im, w_im = shape
+        row_li, col_li, id_li = [], [], []
+        for ind, cent in enumerate(self.grid_cent.values()):
+            rows = np.arange(h_im)[
+                int(cent[1]-self.radius):int(cent[1]+self.radius)]
+            cols = np.arange(w_im)[
+                int(cent[0]-self.radius):int(cent[0]+self.radius)]
+            mask = self.create_circular_mask(len(rows), len(cols))
+            mask_y, mask_x = np.nonzero(mask)
+            row_li.append(rows[mask_y])
+            col_li.append(cols[mask_x])
+            id_li.append(np.full(len(mask_y), ind, dtype=np.intp))
+        index = (np.concatenate(row_li), np.concatenate(col_li),
+                 np.concatenate(id_li))
+        _well_index_cache[key] = index
+        return index
+
+    def get_well_matrix(self, shape):
+        """sparse (n_wells, n_pixels) mask matrix of the wells
+
+        Only pixels covered by a well are kept as columns; `pixels` holds
+        their flat indices in an image of `shape`.
+        """
+        key = ('matrix',) + self.get_grid_key(shape)
+        if key in _well_index_cache:
+            return _well_index_cache[key]
+        rows, cols, well_ids = self.get_well_index(shape)
+        flat = np.ravel_multi_index((rows, cols), shape)
+        pixels, pixel_ids = np.unique(flat, return_inverse=True)
+        well_mat = sparse.csr_matrix(
+            (np.ones(len(flat), dtype=np.int32), (well_ids, pixel_ids)),
+            shape=(len(self.grid_cent), len(pixels)))
+        _well_index_cache[key] = (pixels, well_mat)
+        return pixels, well_mat
+
+    def calculate_rfu(self, im, shape=None):
+        """calculate RFU by image
+
+        `im` is an RGB image or a gray image from `open_well_rows`.
+        `shape` is the full frame shape when `im` holds only its top rows
+        """
+        return self.get_rfu_dict(self.sum_wells(im, shape))
+
+    def sum_wells(self, im, shape=None):
+        "sum of each well mask in grid_cent order, see calculate_rfu"
+        im_sum = im
+        if im.ndim == 3:
+            with stage('gray sum'):
+                im_sum = im.sum(axis=2)
+        rows, cols, well_ids = self.get_well_index(shape or im_sum.shape)
+        with stage('mask sum'):
+            return np.bincount(well_ids, weights=im_sum[rows, cols],
+                               minlength=len(self.grid_cent))
+
+    def sum_frame_wells(self, im_path):
+        return self.sum_wells(*self.open_well_rows(im_path))
 
+    def get_cache_params(self):
+        "everything besides the frame that the well sums depend on"
+        return {'engine': 'SrtRfu16', 'algorithm': self.ALGORITHM_VERSION,
+                'grid': list(self.grid_cent.items()),
+                'radius': self.radius, 'luma': self.luma}
+
+    def get_rfu_dict(self, well_sum):
+        "RFU by well. In luma mode, 3*Y stands for the sum of RGB"
+        region_sum_dict = {}
+        for well, val in zip(self.grid_cent.keys(), well_sum):
+            if self.luma:
+                region_sum_dict[well] = float(3*val)
+            else:
+                region_sum_dict[well] = int(val)
         return region_sum_dict
 
-    def open_im(self, im_path):
+    def calibrate_luma(self, im_path):
+        """compare luma mode RFU of an image with the exact RGB sum RFU
+
+        Returns the gain that maps luma RFU onto RGB sum RFU for this
+        image, and the relative deviation by well left after that gain.
+        """
+        _path = pathlib.Path(im_path)
+        self.set_grid_json(_path)
+        is_luma = self.luma
+        self.luma = False
+        rfu_exact = self.calculate_rfu(*self.open_well_rows(_path))
+        self.luma = True
+        rfu_luma = self.calculate_rfu(*self.open_well_rows(_path))
+        self.luma = is_luma
+        gain = sum(rfu_exact.values()) / sum(rfu_luma.values())
+        deviation = {}
+        for well, val in rfu_exact.items():
+            deviation[well] = gain*rfu_luma[well]/val - 1 if val else np.nan
+        return gain, deviation
+
+    def open_im(self, im_path, y_range=slice(None), x_range=slice(None)):
         "open images. Designed for adding image rotation for 96well"
-        im = np.array(Image.open(im_path))
-        return im
+        return open_roi(im_path, y_range, x_range)
+
+    def open_well_rows(self, im_path):
+        """gray image of the rows down to the last one the well masks cover
+
+        The gray image is the sum of RGB, or the luma plane in luma mode
+        """
+        shape = read_size(im_path)
+        rows, _, _ = self.get_well_index(shape)
+        y_range = slice(0, rows.max()+1)
+        if self.luma:
+            return open_roi(im_path, y_range, luma=True), shape
+        im = self.open_im(im_path, y_range)
+        with stage('gray sum'):
+            return im.sum(axis=2), shape
 
     def label_image(self, im_path):
         im_cropped = self.open_im(im_path)
 
-        im_gray = im_cropped.sum(axis=2)
-        cleared = clear_border(im_gray)
-        thresh = threshold_mean(cleared)
-        threshed_im = cleared > thresh
-        return label(threshed_im), im_gray
+        with stage('gray sum'):
+            im_gray = im_cropped.sum(axis=2)
+        with stage('threshold'):
+            cleared = clear_border(im_gray)
+            thresh = threshold_mean(cleared)
+            threshed_im = cleared > thresh
+        with stage('label'):
+            return label(threshed_im), im_gray
 
     def set_grid(self, ref_path, is_outf=False):
         "get grid by camera from the last cycle"
         im_path = pathlib.Path(ref_path)
         self.grid = self.set_grid_single(im_path)
         self.get_grid_center()
+        self.grid_dir = None
         if is_outf:
-            with open("{}/grid.json".format(im_path.parent), "w") as f:
-                json.dump(self.grid_cent, f)
+            dump_grid_json(im_path.parent, self.grid_cent)
 
     def set_grid_single(self, im_f):
         im_labeled, im_gray = self.label_image(im_f)
-        region_li = self.get_region_li(im_labeled, im_gray)
-        well_box = region_li[0].bbox
+        well_box = RegionStats(im_labeled, im_gray).bbox[0]
         x_li = np.linspace(well_box[1], well_box[3], 5, endpoint=True)
         y_li = np.linspace(well_box[0], well_box[2], 5, endpoint=True)
         pts_li = [(x, y) for x in x_li for y in y_li]
@@ -110,18 +252,75 @@ class SrtRfu16:
 
     def mp_rfu(self, im_path, is_outf=True):
         _path = pathlib.Path(im_path)
-        self.set_grid_json(_path)
-        im = self.open_im(_path)
-        _rfu = self.calculate_rfu(im)
+        self.use_grid(_path)
+        if self.rfu_cache is None:
+            well_sum = self.sum_frame_wells(_path)
+        else:
+            well_sum = self.rfu_cache.get_or_compute(
+                _path, self.get_cache_params(), self.sum_frame_wells)
+        _rfu = self.get_rfu_dict(well_sum)
         if is_outf:
             with open("{}/{}.json".format(_path.parent, _path.stem), "w") as f:
                 json.dump(_rfu, f)
         return _rfu
 
+    def mp_rfu_batch(self, im_path_li):
+        """calculate RFU of an image series of one camera at once
+
+        Frames are stacked into an (n_frames, n_pixels) block and every
+        well of every frame is summed by one sparse matrix product.
+        With a frame cache, only the frames missing from it are stacked.
+        """
+        self.use_grid(pathlib.Path(im_path_li[0]))
+        well_sum = [None]*len(im_path_li)
+        if self.rfu_cache is not None:
+            params = self.get_cache_params()
+            key_li = [self.rfu_cache.get_key(im_path, params)
+                      for im_path in im_path_li]
+            well_sum = [self.rfu_cache.get(key) for key in key_li]
+        todo_li = [ind for ind, frame_sum in enumerate(well_sum)
+                   if frame_sum is None]
+        block = None
+        for row, ind in enumerate(todo_li):
+            im_sum, shape = self.open_well_rows(im_path_li[ind])
+            if block is None:
+                pixels, well_mat = self.get_well_matrix(shape)
+                block = np.empty((len(todo_li), len(pixels)),
+                                 dtype=np.int32)
+            block[row] = im_sum.ravel()[pixels]
+        if block is not None:
+            with stage('mask sum'):
+                block_sum = well_mat.dot(block.T).T
+            for ind, frame_sum in zip(todo_li, block_sum):
+                well_sum[ind] = frame_sum
+                if self.rfu_cache is not None:
+                    self.rfu_cache.put(key_li[ind], frame_sum)
+
+        return [self.get_rfu_dict(frame_sum) for frame_sum in well_sum]
+
     def set_grid_json(self, im_path):
+        """set the grid of the camera directory of im_path
+
+        The grid comes from grid.json through the per process grid cache,
+        or from segmenting ref.jpg when there is no grid.json.
+        """
+        cam_dir = pathlib.Path(im_path).parent
         try:
-            with open('{}/grid.json'.format(im_path.parent), 'r') as f:
-                self.grid_cent = json.load(f)
+            self.grid_cent = load_grid_json(cam_dir)['grid_cent']
         except FileNotFoundError:
-            ref_path = im_path.parent/'ref.jpg'
-            self.set_grid(ref_path)
+            self.set_grid(cam_dir/'ref.jpg')
+        self.grid_dir = cam_dir
+
+    def use_grid(self, im_path):
+        """set the grid for a frame unless it is set for its camera already
+
+        Analyzers whose grid was set in the parent process do no grid I/O
+        in pool workers.
+        """
+        if self.grid_dir != pathlib.Path(im_path).parent:
+            self.set_grid_json(im_path)
+
+    def prime_grid(self, im_path):
+        "set the grid and build its well index for frames like im_path"
+        self.set_grid_json(im_path)
+        self.get_well_index(read_size(im_path))
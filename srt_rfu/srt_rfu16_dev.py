@@ -1,25 +1,24 @@
 from srt_rfu.srt_rfu16 import SrtRfu16
-from srt_rfu.heat_map import heatmap, annotate_heatmap
+from srt_rfu.mp_pool import (
+    call_worker, make_shared_array, map_tasks, start_pool)
+from srt_rfu.rfu_cube import RfuCube
+from srt_rfu.datasheet import RFU_CUBE_NAME, write_datasheets
+from srt_rfu.watch import FrameWatcher
 import pathlib
-import xlsxwriter
-import matplotlib.pyplot as plt
-from matplotlib import patches, colors
 from collections import OrderedDict
 import time
 import datetime
-from itertools import product
-import concurrent.futures
+from itertools import chain, product
 from tqdm import tqdm
-import pandas as pd
 import numpy as np
 
 
 class SrtRfu16Dev(SrtRfu16):
-    def __init__(self, folder_path, dye_exempt=None):
+    def __init__(self, folder_path, dye_exempt=None, luma=False):
         super().__init__()
+        self.luma = luma
         self.cam_path = pathlib.Path(folder_path)
         self.exp_path = self.cam_path.parent
-        self.colors_li = [plt.cm.get_cmap('hsv', 30)(i) for i in range(30)]
         self.temp_li = ['Low Temp', 'High Temp']
         self.cam_key = 'main'
         self.get_dye_dict(dye_exempt)
@@ -42,84 +41,144 @@ class SrtRfu16Dev(SrtRfu16):
         else:
             self.ch_dict = dye_init
     
-    def make_rfu_table(self, tc=45, progress_txt='RFU table progress'):
+    def make_rfu_table(self, tc=45, progress_txt='RFU table progress',
+                       batch=False):
         "concatenate rfu by camera, dye, temp, cycle"
         print('Start creating RFU datatable')
         t = time.time()
-        total_num = len(self.temp_li)*len(self.ch_dict)*tc
+        self.prime_grid(self.get_frame_path(0, 0, 0))
+        rfu_buf, rfu_arr = self.init_rfu_table(tc)
+        if batch:
+            task_li = list(product(range(len(self.temp_li)),
+                                   range(len(self.ch_dict))))
+            map_tasks(self, 'to_mp_rfu_batch', task_li, progress_txt,
+                      shared={'rfu_arr': rfu_buf})
+        else:
+            task_li = list(product(range(len(self.temp_li)),
+                                   range(len(self.ch_dict)), range(tc)))
+            map_tasks(self, 'to_mp_rfu', task_li, progress_txt,
+                      shared={'rfu_arr': rfu_buf})
+        self.finish_rfu_table(tc)
+        print('\nFinish creating RFU table in {} sec.'.format(time.time()-t))
 
-        paramlist = list(product(range(len(self.temp_li)), self.ch_dict.keys(),
-                                 range(tc)))
-        with concurrent.futures.ProcessPoolExecutor() as executor:
-            res_tup_li = list(
-                tqdm(executor.map(self.to_mp_rfu, paramlist),
-                     total=len(paramlist), desc=progress_txt))
-        res_dic = dict(res_tup_li)
+    def watch_rfu_table(self, tc=45, progress_txt='RFU table progress',
+                        poll_sec=0.5, timeout=600):
+        """
+        make_rfu_table for a run in progress. Each frame is processed as soon
+        as the instrument has written it, and self.rfu_cube holds the partial
+        RFU table meanwhile, NaN for the frames still to come.
+        """
+        print('Start watching {}'.format(self.cam_path))
+        task_dict = OrderedDict()
+        for cycle, temp_ind, dye_ind in product(
+                range(tc), range(len(self.temp_li)), range(len(self.ch_dict))):
+            task_dict[self.get_frame_path(temp_ind, dye_ind, cycle)] = (
+                temp_ind, dye_ind, cycle)
+        frame_it = iter(FrameWatcher(task_dict, poll_sec, timeout))
+        first_path = next(frame_it)
+        t = time.time()
+        self.prime_grid(first_path)
+        rfu_buf, rfu_arr = self.init_rfu_table(tc)
+        rfu_arr[:] = np.nan
+        with start_pool(self, 'to_mp_rfu', shared={
+                'rfu_arr': rfu_buf}) as pool, tqdm(
+                    total=len(task_dict), desc=progress_txt) as pbar:
+            res_li = []
+            for im_path in chain([first_path], frame_it):
+                res_li.append(pool.apply_async(
+                    call_worker, (task_dict[im_path],),
+                    callback=lambda _: pbar.update()))
+            for res in res_li:
+                res.get()
+        self.finish_rfu_table(tc)
+        print('\nFinish creating RFU table in {} sec. after the first '
+              'frame'.format(time.time()-t))
 
-        self.rfu_dict = {}
-        for ind, temp in enumerate(self.temp_li):
-            self.rfu_dict[temp] = {}
-            for dye_abb, dye in self.ch_dict.items():
-                _dic = OrderedDict()
-                for cycle in range(tc):
-                    key = str((ind, dye_abb, cycle))
-                    _dic[cycle+1] = res_dic[key]
-                self.rfu_dict[temp][dye] = pd.DataFrame(_dic).T
-        print('\nFinish creating RFU table in {} sec.'.format(time.time()-t))
+    def init_rfu_table(self, tc):
+        """
+        Well order and shared RFU array of a run, once the grid is set.
+        self.rfu_cube views the array, so it follows the workers' results.
+        """
+        self.tc = tc
+        self.well_li = sorted(self.grid_cent.keys())
+        self.well_ind = {well: i for i, well in enumerate(self.well_li)}
+        rfu_buf, rfu_arr = make_shared_array(
+            (len(self.temp_li), len(self.ch_dict), tc, len(self.well_li)))
+        self.rfu_cube = RfuCube(self.temp_li, self.ch_dict.values(),
+                                range(1, tc+1), self.well_li, data=rfu_arr)
+        return rfu_buf, rfu_arr
+
+    def finish_rfu_table(self, tc):
+        if self.luma:
+            self.calibrate_luma_table(tc)
+        self.rfu_dict = self.rfu_cube.to_rfu_dict()
+
+    def calibrate_luma_table(self, tc):
+        "scale luma mode RFU by dye onto RGB sum RFU of the last cycle"
+        self.luma_report = OrderedDict()
+        for dye_abb, dye in self.ch_dict.items():
+            im_path = self.cam_path/'{}_0_{}.jpg'.format(tc-1, dye_abb)
+            gain, deviation = self.calibrate_luma(im_path)
+            rfu = self.rfu_cube.loc(dye=dye)
+            rfu *= gain
+            self.luma_report[dye] = deviation
+            print('{}: luma gain {:.4f}, max deviation {:.2%}'.format(
+                dye, gain, np.nanmax(np.abs(list(deviation.values())))))
     
-    def to_mp_rfu(self, paramlist):
-        im_path = str(self.cam_path/'{}_{}_{}.jpg'.format(
-            paramlist[2], paramlist[0], paramlist[1]))
+    def get_frame_path(self, temp_ind, dye_ind, cycle):
+        return self.cam_path/'{}_{}_{}.jpg'.format(
+            cycle, temp_ind, list(self.ch_dict.keys())[dye_ind])
+
+    def to_mp_rfu(self, temp_ind, dye_ind, cycle):
+        im_path = str(self.get_frame_path(temp_ind, dye_ind, cycle))
         _rfu = self.mp_rfu(im_path, is_outf=False)
-        return str(paramlist), _rfu
+        self.store_rfu((temp_ind, dye_ind, cycle), _rfu)
+
+    def to_mp_rfu_batch(self, temp_ind, dye_ind):
+        im_path_li = [str(self.get_frame_path(temp_ind, dye_ind, cycle))
+                      for cycle in range(self.tc)]
+        for cycle, _rfu in enumerate(self.mp_rfu_batch(im_path_li)):
+            self.store_rfu((temp_ind, dye_ind, cycle), _rfu)
+
+    def store_rfu(self, key, rfu_dic):
+        "write RFU by well of a (temp, dye, cycle) into the shared array"
+        for well, val in rfu_dic.items():
+            self.rfu_arr[key + (self.well_ind[well],)] = val
         
-    def make_end_point_results(self, path):
-        suffix = ' {} -  End Point Results.xlsx'.format(self.version)
-        well_li = [
-            x+'0'+str(y) for x in self.row_name for y in range(
-                self.col_name[0], self.col_name[-1])][::-1]
-        with xlsxwriter.Workbook(
-                str(path/(self.exp_path.name+suffix))) as writer:
-            ws = writer.add_worksheet()
-            ws.write(0, 1, 'Well')
-            ws.write(0, 3, 'Content')
-            for i, well in enumerate(well_li):
-                ws.write(i+1, 1, well)
-                ws.write(i+1, 3, 'Unkn')
+    def get_end_point_well_li(self):
+        return [x+'0'+str(y) for x in self.row_name for y in range(
+            self.col_name[0], self.col_name[-1])][::-1]
 
-    def get_datasheet(self, tc=45):
-        "save rfu table as xlsx for DSP analysis"
-        suffix = ' {} -  Quantitation Amplification Results.xlsx'.format(
-            self.version)
+    def get_datasheet(self, tc=45, batch=False, watch=False):
+        """save rfu table as xlsx for DSP analysis.
+        With `watch`, frames are processed while the run is in progress"""
         qs_li = ['QuantStep1', 'QuantStep2']
-        self.make_rfu_table(tc=tc)
+        if watch:
+            self.watch_rfu_table(tc=tc)
+        else:
+            self.make_rfu_table(tc=tc, batch=batch)
         res_dir = self.exp_path/('DSP_datasheet' + self.get_datetime())
         res_dir.mkdir()
-        for ind, temp in enumerate(self.temp_li):
-            qs_path = res_dir/qs_li[ind]
-            qs_path.mkdir()
-            with pd.ExcelWriter(
-                    str(qs_path/(self.exp_path.name+suffix))) as writer:
-                for dye in self.ch_dict.values():
-                    df = self.rfu_dict[temp][dye]
-                    df = df.reset_index().rename(columns={'index': 'Cycle'})
-                    df.to_excel(writer, sheet_name=dye)
-            self.make_end_point_results(qs_path)
+        self.rfu_cube.meta = {
+            'exp_name': self.exp_path.name, 'version': self.version,
+            'quant_step_li': qs_li,
+            'end_point_well_li': self.get_end_point_well_li()}
+        write_datasheets(self.rfu_cube, res_dir)
+        self.rfu_cube.save(res_dir/RFU_CUBE_NAME)
         
     def get_ref_im(self, im_path):
         ref_path = im_path.parent/'ref.jpg'
         return self.open_im(ref_path)
         
     def plot_grid(self, ax):
+        from srt_rfu.qc_plot import well_circle
         for pts in self.grid.values():
             ax.scatter(pts[1], pts[0], c='g')
             ax.scatter(pts[3], pts[2], c='g')
             cent_y = int((pts[3] + pts[1])/2)
             cent_x = int((pts[2] + pts[0])/2)
             ax.scatter(cent_y, cent_x, c='r')
-            circ = patches.Circle((cent_y, cent_x), radius=100, color='r',
-                                  fill=False, linewidth=1)
-            ax.add_patch(circ)
+            ax.add_patch(well_circle((cent_y, cent_x), 100))
             
     def plot_rfu_table(self, rfu_dic, ax):
         table_cell = []
@@ -139,14 +198,8 @@ class SrtRfu16Dev(SrtRfu16):
         return table_cell
         
     def plot_rfu_heatmap(self, table_cell, ax):
-        cell_np = np.array(table_cell)
-        data_rt_mean = np.true_divide(cell_np, np.mean(cell_np))
-        boundary = [0, 0.5, 0.7, 0.9, 1.1, 1.3, 1.5, 2]
-        norm = colors.BoundaryNorm(boundary, 7)
-        im, cbar = heatmap(data_rt_mean, self.row_name, self.col_name, ax=ax,
-                           cmap=plt.get_cmap('coolwarm', 7), norm=norm,
-                           cbarlabel='RFU divided by mean')
-        annotate_heatmap(im, textcolors=['black', 'black'])
+        from srt_rfu.qc_plot import plot_ratio_heatmap
+        plot_ratio_heatmap(table_cell, self.row_name, self.col_name, ax)
         
     def get_single_result(self, im_path_in):
         im_path = pathlib.Path(im_path_in)
@@ -156,6 +209,7 @@ class SrtRfu16Dev(SrtRfu16):
             'Single_Result_{}-{}'.format(self.version, im_path.stem) +
             self.get_datetime() + '.jpg')
 
+        from srt_rfu.qc_plot import plt
         rfu_dict = self.mp_rfu(im_path_in, is_outf=False)
         fig, ax = plt.subplots(2, 3, figsize=(18, 12), constrained_layout=True)
         ax[0, 0].imshow(self.open_im(im_path))
@@ -1,4 +1,3 @@
-import subprocess
 import pathlib
 from collections import OrderedDict
 from skimage.filters import threshold_mean
@@ -6,8 +5,51 @@ from skimage.measure import regionprops, label
 from skimage.segmentation import clear_border
 import numpy as np
 from PIL import Image
-import matplotlib.pyplot as plt
 import json
+from srt_rfu.version import get_version
+
+DUMMY_PATH = pathlib.Path(__file__).resolve().parent.parent/'dummy_data'
+# DummyData by step file; loaded once per process and read-only, so that
+# workers forked after a first calculate_rfu share the parent's arrays
+_dummy_data_cache = {}
+
+
+class DummyData:
+    """
+    RFU of a dummy_data step file as a dense array by (dye, well, cycle).
+    The array has one well more than the file, all NaN, which is where
+    get_well_index points wells the file has no data for.
+    """
+
+    def __init__(self, path):
+        with open(str(path), 'r') as f:
+            raw = json.load(f)
+        self.dye_ind = {dye: i for i, dye in enumerate(raw)}
+        well_li = sorted({well for well_dic in raw.values()
+                          for well in well_dic})
+        self.well_ind = {well: i for i, well in enumerate(well_li)}
+        n_cycle = max(len(cycle_dic) for well_dic in raw.values()
+                      for cycle_dic in well_dic.values())
+        self.arr = np.full((len(raw), len(well_li)+1, n_cycle), np.nan)
+        for dye, well_dic in raw.items():
+            for well, cycle_dic in well_dic.items():
+                for cycle, val in cycle_dic.items():
+                    self.arr[self.dye_ind[dye], self.well_ind[well],
+                             int(cycle)] = val
+        self.arr.flags.writeable = False
+
+    def get_well_index(self, well_li):
+        "index of each well of well_li in the array, the NaN well if absent"
+        return np.array([self.well_ind.get(well, -1) for well in well_li],
+                        dtype=np.intp)
+
+
+def load_dummy_data(path):
+    "DummyData of a step file, from the per process cache"
+    key = str(path)
+    if key not in _dummy_data_cache:
+        _dummy_data_cache[key] = DummyData(path)
+    return _dummy_data_cache[key]
 
 
 class SrtRfu16:
@@ -16,13 +58,12 @@ class SrtRfu16:
         self.grid_cent = None
         self.row_name = list('ABCD')
         self.col_name = range(1, 5)
-        self.version = subprocess.check_output(
-            ['git', 'rev-parse', '--short', 'HEAD']).decode('utf-8').strip()
+        self.version = get_version()
         self.step_li = ['3', '4', '7']
         self.dummy_data_path = [
-            pathlib.Path('dummy_data/QuantStep4/q4.json'),
-            pathlib.Path('dummy_data/QuantStep5/q5.json'),
-            pathlib.Path('dummy_data/MeltStep8/melt.json')
+            DUMMY_PATH/'QuantStep4/q4.json',
+            DUMMY_PATH/'QuantStep5/q5.json',
+            DUMMY_PATH/'MeltStep8/melt.json'
         ]
         self.dummy_well_name = [
             [x+str(y) for y in range(1, 5) for x in list('ABCD')],
@@ -62,25 +103,30 @@ class SrtRfu16:
         mask = dist_from_center <= radius
         return mask
 
+    def preload(self):
+        """load every step file into the cache of this process, so that
+        calculate_rfu only indexes arrays. The first calculate_rfu of each
+        process calls it; spawned workers load their own copy then"""
+        for path in self.dummy_data_path:
+            load_dummy_data(path)
+
     def calculate_rfu(self, im_path):
-        "Read dummy data"
-        region_sum_dict = {}
+        "Read dummy data, NaN for wells without data"
+        if str(self.dummy_data_path[-1]) not in _dummy_data_cache:
+            self.preload()
         im_name = im_path.stem
         _, step, cycle, cam_ind, ch = im_name.split('_')
         if step in self.step_li:
             ind = self.step_li.index(step)
-            with open(str(self.dummy_data_path[ind]), 'r') as f:
-                dummy_data = json.load(f)
-            for well in self.dummy_well_name[int(cam_ind)]:
-                if well in dummy_data[self.ch_dict[ch]].keys():
-                    region_sum_dict[well] = dummy_data[self.ch_dict[ch]][well][
-                        cycle]
-                else:
-                    region_sum_dict[well] = np.nan
+            dummy_data = load_dummy_data(self.dummy_data_path[ind])
+            well_li = self.dummy_well_name[int(cam_ind)]
+            rfu = dummy_data.arr[dummy_data.dye_ind[self.ch_dict[ch]],
+                                 dummy_data.get_well_index(well_li),
+                                 int(cycle)]
         else:
             raise
 
-        return region_sum_dict
+        return dict(zip(well_li, rfu.tolist()))
 
     def open_im(self, im_path):
         "open images. Designed for adding image rotation for 96well"
@@ -1,4 +1,3 @@
-import subprocess
 import concurrent.futures
 from itertools import product
 from tqdm import tqdm
@@ -11,15 +10,13 @@ from skimage.filters import threshold_mean
 from skimage.measure import regionprops, label
 from skimage.morphology import closing, opening, disk
 from skimage.segmentation import clear_border
-from skimage.color import label2rgb
 import numpy as np
 import pandas as pd
 from PIL import Image
-import matplotlib
-import matplotlib.pyplot as plt
-from matplotlib import patches
+from srt_rfu.im_loader import open_roi
 from srt_rfu.progress_bar import printProgressBar
-from srt_rfu.heat_map import heatmap, annotate_heatmap
+from srt_rfu.version import get_version
+from srt_rfu.well_assign import assign_wells, plot_assignment
 
 
 class SrtRfu16Leg:
@@ -30,11 +27,9 @@ class SrtRfu16Leg:
         self.x_range = slice(500, 2100)
         self.well_area_max = (self.y_range.stop - self.y_range.start) * (
             self.x_range.stop - self.x_range.start) * 0.2
-        self.colors_li = [plt.cm.get_cmap('hsv', 30)(i) for i in range(30)]
         self.row_name = list('ABCD')
         self.col_name = range(1, 5)
-        self.version = subprocess.check_output(
-            ['git', 'rev-parse', '--short', 'HEAD']).decode('utf-8').strip()
+        self.version = get_version()
         self.get_dye_dict(dye_exempt)
 
     def get_datetime(self):
@@ -63,26 +58,6 @@ class SrtRfu16Leg:
             region_li, key=lambda tup: tup[0], reverse=True)
         return [region for area, region in sorted_region_li]
 
-    def get_grid_loc(self, x, y):
-        well_location_dict = self.grid
-        for well in well_location_dict.keys():
-            y_min, x_min, y_max, x_max = well_location_dict[well]
-            if y_min < y < y_max and x_min < x < x_max:
-                return well
-        return None
-
-    def get_well_name(self, x, y, pts_center):
-        well_location_dict = self.grid
-        for well in well_location_dict.keys():
-            y_min, x_min, y_max, x_max = well_location_dict[well]
-            if y_min < y < y_max and x_min < x < x_max:
-                radius = (x_max-x_min)/2 - 50
-                pts_given = np.array([x, y])
-                distance = np.linalg.norm(pts_given-pts_center)
-                if distance < radius:
-                    return well, radius
-        return None, None
-
     def plot_grid(self, ax):
         for pts in self.grid.values():
             ax.scatter(pts[1], pts[0], c='g')
@@ -90,48 +65,28 @@ class SrtRfu16Leg:
 
     def calculate_rfu(self, region_li, ax=None):
         "calculate RFU by image"
+        region_li = [region_obj for region_obj in region_li
+                     if region_obj.area <= self.well_area_max]
+        centroid = np.array([region_obj.centroid for region_obj in region_li],
+                            dtype=np.float64).reshape(-1, 2)
+        y, x = centroid.T
+        well_li, rect_ind, well_ind, center_ind, radius = assign_wells(
+            self.grid, y, x)
         region_sum_dict = {}
         for key in self.grid.keys():
             region_sum_dict[key] = 0
-        center_at_cycle = {}
-        circle_li = []
-        for region_obj in region_li:
-            if region_obj.area > self.well_area_max:
-                continue
-            y, x = region_obj.centroid
-            grid = self.get_grid_loc(x, y)
-            if grid is None:
-                continue
-
-            if grid not in center_at_cycle.keys():
-                center = [x, y]
-                center_at_cycle[grid] = center
-                if ax:
-                    well, rad = self.get_well_name(x, y, center)
-                    circle_li.append(patches.Circle(
-                        center, radius=rad, color='r', fill=False,
-                        linewidth=1))
-            else:
-                center = center_at_cycle[grid]
-            well, rad = self.get_well_name(x, y, center)
-
-            if well is not None:
-                region_sum_dict[well] += region_obj.intensity_image.sum()
-                if ax:
-                    ax.plot(x, y, color='white', marker='*')
-                    ax.text(x, y, well, color='gray')
-            elif ax:
-                ax.plot(x, y, color='b', marker='x')
+        for ind in np.flatnonzero(well_ind >= 0):
+            region_sum_dict[well_li[well_ind[ind]]] += (
+                region_li[ind].intensity_image.sum())
         if ax:
             self.plot_grid(ax)
-            for circle in circle_li:
-                ax.add_artist(circle)
+            plot_assignment(ax, y, x, well_li, rect_ind, well_ind,
+                            center_ind, radius)
         return region_sum_dict
 
     def open_im(self, im_path):
         "open images. Designed for adding image rotation for 96well"
-        im = np.array(Image.open(im_path))
-        return im[self.y_range, self.x_range]
+        return open_roi(im_path, self.y_range, self.x_range)
 
     def label_image(self, im_path):
         im_cropped = self.open_im(im_path)
@@ -290,19 +245,15 @@ class SrtRfu16Leg:
 
     def plot_processing_result(self, im_path, col_li, row_li, outf_path,
                                title):
+        from srt_rfu.qc_plot import (
+            plt, label_overlay, crop_rect, plot_ratio_heatmap)
         im_labeled, im_gray = self.label_image(im_path)
-        image_label_overlay = label2rgb(
-            im_labeled, bg_label=0, colors=self.colors_li)
+        image_label_overlay = label_overlay(im_labeled)
         region_li = self.get_region_li(im_labeled, im_gray)
 
         fig, ax = plt.subplots(2, 3, figsize=(18, 12), constrained_layout=True)
         ax[0, 0].imshow(np.array(Image.open(im_path)))
-        rect = patches.Rectangle(
-            (self.x_range.start, self.y_range.start),
-            self.x_range.stop-self.x_range.start,
-            self.y_range.stop-self.y_range.start,
-            edgecolor='r', facecolor='none')
-        ax[0, 0].add_patch(rect)
+        ax[0, 0].add_patch(crop_rect(self.x_range, self.y_range))
         ax[0, 0].set_title('Original')
         ax[0, 1].imshow(im_gray)
         ax[0, 1].set_title('Gray')
@@ -328,13 +279,6 @@ class SrtRfu16Leg:
         ax[0, 2].axis('auto')
         ax[0, 2].set_title(title)
 
-        cell_np = np.array(table_cell)
-        data_rt_mean = np.true_divide(cell_np, np.mean(cell_np))
-        boundary = [0, 0.5, 0.7, 0.9, 1.1, 1.3, 1.5, 2]
-        norm = matplotlib.colors.BoundaryNorm(boundary, 7)
-        im, cbar = heatmap(data_rt_mean, row_li, col_li, ax=ax[1, 2],
-                           cmap=plt.get_cmap('coolwarm', 7), norm=norm,
-                           cbarlabel='RFU divided by mean')
-        annotate_heatmap(im, textcolors=['black', 'black'])
+        plot_ratio_heatmap(table_cell, row_li, col_li, ax[1, 2])
         plt.savefig(str(outf_path))
         print(region_sum_dict)
@@ -1,28 +1,32 @@
-import subprocess
-import concurrent.futures
 from itertools import product
-from tqdm import tqdm
 import pathlib
-import xlsxwriter
 import datetime
 import time
 from collections import OrderedDict
 from skimage.filters import threshold_mean
-from skimage.measure import regionprops, label
-from skimage.morphology import closing, opening, disk
+from skimage.measure import label
 from skimage.segmentation import clear_border
-from skimage.color import label2rgb
 import numpy as np
-import pandas as pd
 from PIL import Image
-import matplotlib
-import matplotlib.pyplot as plt
-from matplotlib import patches
-from srt_rfu.progress_bar import printProgressBar
-from srt_rfu.heat_map import heatmap, annotate_heatmap
+from srt_rfu.im_loader import open_roi
+from srt_rfu.mp_pool import map_tasks, make_shared_array
+from srt_rfu.morphology import disk_closing, disk_opening
+from srt_rfu.profiler import stage
+from srt_rfu.rfu_cube import RfuCube
+from srt_rfu.datasheet import RFU_CUBE_NAME, write_datasheets
+from srt_rfu.region_stats import RegionStats
+from srt_rfu.version import get_version
+from srt_rfu.well_assign import assign_wells, plot_assignment
 
 
 class SrtRfu32:
+    # bump when a change alters the region statistics, so that RfuCache
+    # entries of the old algorithm are not used
+    ALGORITHM_VERSION = 1
+    # disk radii of the opening and closing of the thresholded frame
+    OPENING_RADIUS = 11
+    CLOSING_RADIUS = 3
+
     def __init__(self, exp_path, dye_exempt=None):
         self.exp_path = pathlib.Path(exp_path)
         self.temp_li = ['Low Temp', 'High Temp']
@@ -30,12 +34,14 @@ class SrtRfu32:
         self.x_range = slice(500, 2100)
         self.well_area_max = (self.y_range.stop - self.y_range.start) * (
             self.x_range.stop - self.x_range.start) * 0.2
-        self.colors_li = [plt.cm.get_cmap('hsv', 30)(i) for i in range(30)]
         self.row_name = list('ABCD')
         self.col_name = [range(1, 5), range(5, 9)]
         self.cam_keys = ['main', 'sub']
-        self.version = subprocess.check_output(
-            ['git', 'rev-parse', '--short', 'HEAD']).decode('utf-8').strip()
+        self.rot90_k = 0
+        self.rfu_cache = None
+        # (dye_ind, cam_ind) -> get_well_mask, set in fixed mask mode
+        self.well_mask = {}
+        self.version = get_version()
         self.get_dye_dict(dye_exempt)
 
     def get_dye_dict(self, dye_exempt):
@@ -53,122 +59,92 @@ class SrtRfu32:
         else:
             self.ch_dict = dye_init
 
-    def get_region_li(self, im_labeled, im_gray):
-        region_li = []
-        for region in regionprops(im_labeled, intensity_image=im_gray):
-            region_li.append((region.area, region))
-        sorted_region_li = sorted(
-            region_li, key=lambda tup: tup[0], reverse=True)
-        return [region for area, region in sorted_region_li]
-
-    def get_grid_loc(self, x, y, cam):
-        well_location_dict = self.grid[cam]
-        for well in well_location_dict.keys():
-            y_min, x_min, y_max, x_max = well_location_dict[well]
-            if y_min < y < y_max and x_min < x < x_max:
-                return well
-        return None
-
-    def get_well_name(self, x, y, pts_center, cam):
-        well_location_dict = self.grid[cam]
-        for well in well_location_dict.keys():
-            y_min, x_min, y_max, x_max = well_location_dict[well]
-            if y_min < y < y_max and x_min < x < x_max:
-                radius = (x_max-x_min)/2 - 50
-                pts_given = np.array([x, y])
-                distance = np.linalg.norm(pts_given-pts_center)
-                if distance < radius:
-                    return well, radius
-        return None, None
-
     def plot_grid(self, cam, ax):
         for pts in self.grid[cam].values():
             ax.scatter(pts[1], pts[0], c='g')
             ax.scatter(pts[3], pts[2], c='g')
 
-    def calculate_rfu(self, region_li, cam, ax=None):
-        "calculate RFU by image"
-        region_sum_dict = {}
-        for key in self.grid[cam].keys():
-            region_sum_dict[key] = 0
-        center_at_cycle = {}
-        circle_li = []
-        for region_obj in region_li:
-            if region_obj.area > self.well_area_max:
-                continue
-            y, x = region_obj.centroid
-            grid = self.get_grid_loc(x, y, cam)
-            if grid is None:
-                continue
-
-            if grid not in center_at_cycle.keys():
-                center = [x, y]
-                center_at_cycle[grid] = center
-                if ax:
-                    well, rad = self.get_well_name(x, y, center, cam)
-                    circle_li.append(patches.Circle(
-                        center, radius=rad, color='r', fill=False,
-                        linewidth=1))
-            else:
-                center = center_at_cycle[grid]
-            well, rad = self.get_well_name(x, y, center, cam)
-
-            if well is not None:
-                region_sum_dict[well] += region_obj.intensity_image.sum()
-                if ax:
-                    ax.plot(x, y, color='white', marker='*')
-                    ax.text(x, y, well, color='gray')
-            elif ax:
-                ax.plot(x, y, color='b', marker='x')
+    def get_region_stats(self, im_labeled, im_gray):
+        """
+        (area, centroid y, centroid x, intensity sum) of each region by
+        descending area as the rows of an (n, 4) array, see RegionStats.
+        The array is all calculate_rfu needs, so frames can be segmented
+        before the grid is known and sent between processes cheaply.
+        """
+        return RegionStats(im_labeled, im_gray).to_array()
+
+    def calculate_rfu(self, region_stats, cam, ax=None):
+        "calculate RFU by image from its get_region_stats"
+        with stage('assignment'):
+            area, y, x, intensity_sum = np.asarray(
+                region_stats).reshape(-1, 4).T
+            small = area <= self.well_area_max
+            y, x, intensity_sum = y[small], x[small], intensity_sum[small]
+            well_li, rect_ind, well_ind, center_ind, radius = assign_wells(
+                self.grid[cam], y, x)
+            in_well = well_ind >= 0
+            rfu = np.bincount(well_ind[in_well], intensity_sum[in_well],
+                              len(well_li))
         if ax:
             self.plot_grid(cam, ax)
-            for circle in circle_li:
-                ax.add_artist(circle)
-        return region_sum_dict
+            plot_assignment(ax, y, x, well_li, rect_ind, well_ind,
+                            center_ind, radius)
+        return dict(zip(well_li, rfu.tolist()))
 
     def open_im(self, im_path):
-        "open images. Designed for adding image rotation for 96well"
-        im = np.array(Image.open(im_path))
-        return im[self.y_range, self.x_range]
-
-    def label_image(self, im_path):
+        """open images, rotated by rot90_k quarter turns counterclockwise
+
+        The rotation is an exact np.rot90 view of the uint8 crop, so no
+        pixel is copied, interpolated or rescaled. Front and side frames
+        used to be turned by skimage rotate into a [0, 1] float image,
+        whose gray sum clear_border mostly cleared, see ALGORITHM_VERSION
+        of SrtRfu32F.
+        """
+        im = open_roi(im_path, self.y_range, self.x_range)
+        with stage('rotate'):
+            return np.rot90(im, self.rot90_k)
+
+    def threshold_image(self, im_path):
+        "mask of the pixels above the mean, borders cleared, and gray image"
         im_cropped = self.open_im(im_path)
 
-        im_gray = im_cropped.sum(axis=2)
-        cleared = clear_border(im_gray)
-        thresh = threshold_mean(cleared)
-        threshed_im = cleared > thresh
+        with stage('gray sum'):
+            im_gray = im_cropped.sum(axis=2)
+        with stage('threshold'):
+            cleared = clear_border(im_gray)
+            thresh = threshold_mean(cleared)
+            return cleared > thresh, im_gray
 
-        bw = opening(threshed_im, disk(11))
-        bw2 = closing(bw, disk(3))
-        return label(bw2), im_gray
+    def label_image(self, im_path):
+        threshed_im, im_gray = self.threshold_image(im_path)
+        with stage('morphology'):
+            bw = disk_opening(threshed_im, self.OPENING_RADIUS)
+            bw2 = disk_closing(bw, self.CLOSING_RADIUS)
+        with stage('label'):
+            return label(bw2), im_gray
 
     def set_grid(self, tc=45):
         "get grid by camera from the last cycle"
-        self.grid = {'main': {}, 'sub': {}}
-        main_grid_im_path = self.exp_path/'{}/{}_0_{}.jpg'.format(
-            self.cam_keys[0], tc-1, list(self.ch_dict.keys())[0])
-        sub_grid_im_path = self.exp_path/'{}/{}_0_{}.jpg'.format(
-            self.cam_keys[1], tc-1, list(self.ch_dict.keys())[0])
-        for idx, im_path in enumerate([main_grid_im_path, sub_grid_im_path]):
-            self.grid[self.cam_keys[idx]] = self.set_grid_single(im_path, idx)
+        self.grid = {}
+        for idx, cam in enumerate(self.cam_keys):
+            self.grid[cam] = self.set_grid_single(
+                self.get_grid_im_path(idx, tc), idx)
+
+    def get_grid_im_path(self, idx, tc=45):
+        "image of the last cycle that locates the wells of a camera"
+        return self.exp_path/'{}/{}_0_{}.jpg'.format(
+            self.cam_keys[idx], tc-1, list(self.ch_dict.keys())[0])
+
+    def get_grid_well_li(self, idx=0):
+        "well names of a camera in the order set_grid_single lists them"
+        return [self.get_well_name4grid(i, j, idx)
+                for i in range(4) for j in range(4)]
 
     def set_grid_single(self, im_path, idx=0):
         im_labeled, im_gray = self.label_image(im_path)
-        region_li = self.get_region_li(im_labeled, im_gray)
-        bbox_key_li = ['minr', 'minc', 'maxr', 'maxc']
-        bbox_dic = {}
-        for key in bbox_key_li:
-            bbox_dic[key] = []
-        for region in region_li:
-            bbox_li = region.bbox
-            for i, k in enumerate(bbox_key_li):
-                bbox_dic[k] += [bbox_li[i]]
-        well_box = []
-        for key3 in bbox_key_li[:2]:
-            well_box.append(sorted(bbox_dic[key3])[0]-50)
-        for key4 in bbox_key_li[2:]:
-            well_box.append(sorted(bbox_dic[key4])[-1]+50)
+        bbox = RegionStats(im_labeled, im_gray).bbox
+        well_box = np.concatenate(
+            [bbox[:, :2].min(axis=0) - 50, bbox[:, 2:].max(axis=0) + 50])
         x_li = np.linspace(well_box[1], well_box[3], 5, endpoint=True)
         y_li = np.linspace(well_box[0], well_box[2], 5, endpoint=True)
         pts_li = [(x, y) for x in x_li for y in y_li]
@@ -187,83 +163,192 @@ class SrtRfu32:
     def get_well_name4grid(self, i, j, idx):
         return self.row_name[j] + str(self.col_name[idx][i])
 
-    def make_rfu_table(self, tc=45, progress_txt='RFU table progress'):
-        "concatenate rfu by camera, dye, temp, cycle"
+    def make_rfu_table(self, tc=45, progress_txt='RFU table progress',
+                       fixed_mask=False):
+        """concatenate rfu by camera, dye, temp, cycle.
+        With `fixed_mask`, see set_well_masks"""
         print('Start creating RFU datatable')
         t = time.time()
-        total_num = len(self.temp_li)*len(self.ch_dict)*tc*len(self.cam_keys)
-        prog = 1
-
-        paramlist = list(product(range(len(self.temp_li)), self.ch_dict.keys(),
-                                 range(tc), self.cam_keys))
-        with concurrent.futures.ProcessPoolExecutor() as executor:
-            res_tup_li = list(
-                tqdm(executor.map(self.mp_rfu, paramlist),
-                     total=len(paramlist), desc=progress_txt))
-        res_dic = dict(res_tup_li)
-
-        self.rfu_dict = {}
-        for ind, temp in enumerate(self.temp_li):
-            self.rfu_dict[temp] = {}
-            for dye_abb, dye in self.ch_dict.items():
-                _dic2 = OrderedDict()
-                for cycle in range(tc):
-                    _dic = OrderedDict()
-                    for cam in self.cam_keys:
-                        key = str((ind, dye_abb, cycle, cam))
-                        _dic.update(res_dic[key])
-                        prog += 1
-                        printProgressBar(
-                            prog, total_num, 'Data processing:', 'Complete')
-                    _dic2[cycle+1] = _dic
-                self.rfu_dict[temp][dye] = pd.DataFrame(_dic2).T
+        self.well_li = sorted(
+            well for cam in self.cam_keys for well in self.grid[cam])
+        self.well_ind = {well: i for i, well in enumerate(self.well_li)}
+        if fixed_mask:
+            self.set_well_masks(tc)
+
+        rfu_buf, rfu_arr = make_shared_array(
+            (len(self.temp_li), len(self.ch_dict), tc, len(self.well_li)))
+        task_li = list(product(range(len(self.temp_li)),
+                               range(len(self.ch_dict)), range(tc),
+                               range(len(self.cam_keys))))
+        map_tasks(self, 'mp_rfu', task_li, progress_txt,
+                  shared={'rfu_arr': rfu_buf})
+        self.rfu_cube = RfuCube(self.temp_li, self.ch_dict.values(),
+                                range(1, tc+1), self.well_li, data=rfu_arr)
+        if fixed_mask:
+            self.report_drift(tc)
+        self.rfu_dict = self.rfu_cube.to_rfu_dict()
         print('\nFinish creating RFU table in {} sec.'.format(time.time()-t))
 
-    def mp_rfu(self, paramlist):
-        im_path = self.exp_path/'{}/{}_{}_{}.jpg'.format(
-            paramlist[3], paramlist[2], paramlist[0], paramlist[1])
+    def set_well_masks(self, tc):
+        """
+        Fixed mask mode: segment only the last cycle frame of each dye and
+        camera, and sum every other frame over the well masks found there,
+        as SrtRfu16 does with its circular masks. The plate does not move
+        during a run, so this skips thresholding, morphology and labeling
+        on all the other frames. report_drift tells how far it is from
+        segmenting every frame.
+        """
+        task_li = list(product(range(len(self.ch_dict)),
+                               range(len(self.cam_keys))))
+        mask_li = map_tasks(self, 'get_well_mask',
+                            [task + (tc,) for task in task_li],
+                            'Well mask progress')
+        self.well_mask = dict(zip(task_li, mask_li))
+
+    def get_well_mask(self, dye_ind, cam_ind, tc):
+        """
+        Well masks of a camera and dye from its last cycle frame: the
+        regions calculate_rfu assigns to each well. A list of (well,
+        (y_min, x_min, y_max, x_max), mask of the box) of the wells that
+        have regions.
+        """
+        im_labeled, im_gray = self.label_image(
+            self.get_frame_path(0, dye_ind, tc-1, cam_ind))
+        stats = RegionStats(im_labeled, im_gray)
+        small = stats.area <= self.well_area_max
+        well_li, _, well_ind, _, _ = assign_wells(
+            self.grid[self.cam_keys[cam_ind]], *stats.centroid[small].T)
+        mask_li = []
+        for ind, well in enumerate(well_li):
+            in_well = well_ind == ind
+            if not in_well.any():
+                continue
+            bbox = stats.bbox[small][in_well]
+            box = (*bbox[:, :2].min(axis=0), *bbox[:, 2:].max(axis=0))
+            mask = np.isin(im_labeled[box[0]:box[2], box[1]:box[3]],
+                           stats.label[small][in_well])
+            mask_li.append((well, box, mask))
+        return mask_li
+
+    def sum_well_mask(self, im_path, dye_ind, cam_ind):
+        "RFU by well of a frame over the fixed well masks, see set_well_masks"
+        im = self.open_im(im_path)
+        region_sum_dict = dict.fromkeys(self.grid[self.cam_keys[cam_ind]], 0)
+        with stage('mask sum'):
+            for well, box, mask in self.well_mask[(dye_ind, cam_ind)]:
+                region_sum_dict[well] = float(
+                    im[box[0]:box[2], box[1]:box[3]][mask].sum())
+        return region_sum_dict
+
+    def get_drift_sample_li(self, tc):
+        "(temp, dye, cycle, cam) of the frames report_drift segments"
+        return list(product(
+            range(len(self.temp_li)), range(len(self.ch_dict)),
+            sorted({0, tc//2, tc-1}), range(len(self.cam_keys))))
+
+    def mp_drift(self, temp_ind, dye_ind, cycle, cam_ind):
+        "RFU by well of a frame segmented in full, for report_drift"
+        region_stats = self.segment_frame(
+            self.get_frame_path(temp_ind, dye_ind, cycle, cam_ind))
+        return self.calculate_rfu(region_stats, self.cam_keys[cam_ind])
+
+    def report_drift(self, tc):
+        """
+        Segment sample frames of a fixed mask run in full and report the
+        relative deviation of the fixed mask RFU from their RFU, by dye the
+        largest by well over the samples, NaN for wells with no RFU.
+        """
+        sample_li = self.get_drift_sample_li(tc)
+        rfu_li = map_tasks(self, 'mp_drift', sample_li,
+                           'Drift check progress')
+        self.drift_report = OrderedDict()
+        for sample, rfu_dic in zip(sample_li, rfu_li):
+            self.add_drift(self.drift_report, sample, rfu_dic, self.rfu_cube)
+        self.print_drift_report(self.drift_report)
+
+    def add_drift(self, drift_report, sample, rfu_dic, rfu_cube):
+        "deviation of a sample frame into drift_report, see report_drift"
+        temp_ind, dye_ind, cycle, _ = sample
+        dye = list(self.ch_dict.values())[dye_ind]
+        deviation = drift_report.setdefault(dye, {})
+        for well, val in rfu_dic.items():
+            if not val:
+                deviation.setdefault(well, np.nan)
+                continue
+            fixed_val = rfu_cube.loc(self.temp_li[temp_ind], dye, cycle+1,
+                                     well)
+            dev = abs(fixed_val/val - 1)
+            if not deviation.get(well, -1) >= dev:
+                deviation[well] = dev
+
+    def print_drift_report(self, drift_report):
+        for dye, deviation in drift_report.items():
+            dev_li = [dev for dev in deviation.values() if dev == dev]
+            print('{}: fixed mask max drift {:.2%} over {} wells'.format(
+                dye, max(dev_li, default=np.nan), len(dev_li)))
+
+    def get_frame_path(self, temp_ind, dye_ind, cycle, cam_ind):
+        return self.exp_path/'{}/{}_{}_{}.jpg'.format(
+            self.cam_keys[cam_ind], cycle, temp_ind,
+            list(self.ch_dict.keys())[dye_ind])
+
+    def segment_frame(self, im_path):
+        """region statistics of a frame, see get_region_stats.
+        They do not depend on the grid, so they are what the frame cache
+        keeps"""
+        if self.rfu_cache is None:
+            return self.get_frame_stats(im_path)
+        return self.rfu_cache.get_or_compute(
+            im_path, self.get_cache_params(), self.get_frame_stats)
+
+    def get_frame_stats(self, im_path):
         im_labeled, im_gray = self.label_image(im_path)
-        region_li = self.get_region_li(im_labeled, im_gray)
-        _rfu = self.calculate_rfu(region_li, paramlist[3])
-        return str(paramlist), _rfu
-
-    def make_end_point_results(self, path):
-        suffix = ' {} -  End Point Results.xlsx'.format(self.version)
-        well_li = [
-            x+'0'+str(y) for x in self.row_name for y in range(
-                self.col_name[0][0], self.col_name[1][-1])][::-1]
-        with xlsxwriter.Workbook(
-                str(path/(self.exp_path.name+suffix))) as writer:
-            ws = writer.add_worksheet()
-            ws.write(0, 1, 'Well')
-            ws.write(0, 3, 'Content')
-            for i, well in enumerate(well_li):
-                ws.write(i+1, 1, well)
-                ws.write(i+1, 3, 'Unkn')
-
-    def get_datasheet(self, tc=45):
-        "save rfu table as xlsx for DSP analysis"
-        suffix = ' {} -  Quantitation Amplification Results.xlsx'.format(
-            self.version)
+        return self.get_region_stats(im_labeled, im_gray)
+
+    def get_cache_params(self):
+        "everything besides the frame that the region statistics depend on"
+        return {'engine': 'SrtRfu32', 'algorithm': self.ALGORITHM_VERSION,
+                'y_range': [self.y_range.start, self.y_range.stop],
+                'x_range': [self.x_range.start, self.x_range.stop],
+                'rot90_k': self.rot90_k}
+
+    def mp_rfu(self, temp_ind, dye_ind, cycle, cam_ind):
+        im_path = self.get_frame_path(temp_ind, dye_ind, cycle, cam_ind)
+        if self.well_mask:
+            _rfu = self.sum_well_mask(im_path, dye_ind, cam_ind)
+        else:
+            _rfu = self.calculate_rfu(self.segment_frame(im_path),
+                                      self.cam_keys[cam_ind])
+        self.store_rfu((temp_ind, dye_ind, cycle), _rfu)
+
+    def store_rfu(self, key, rfu_dic):
+        "write RFU by well of a (temp, dye, cycle) into the shared array"
+        for well, val in rfu_dic.items():
+            self.rfu_arr[key + (self.well_ind[well],)] = val
+
+    def get_end_point_well_li(self):
+        return [x+'0'+str(y) for x in self.row_name for y in range(
+            self.col_name[0][0], self.col_name[1][-1])][::-1]
+
+    def get_datasheet(self, tc=45, fixed_mask=False):
+        """save rfu table as xlsx for DSP analysis.
+        With `fixed_mask`, frames are summed over the well masks of the last
+        cycle instead of being segmented, see set_well_masks"""
         qs_li = ['QuantStep60', 'QuantStep72']
         self.set_grid(tc=tc)
-        self.make_rfu_table(tc=tc)
+        self.make_rfu_table(tc=tc, fixed_mask=fixed_mask)
         res_dir = self.exp_path/'DSP_datasheet'
         if res_dir.exists():
             res_dir = self.exp_path/(
                 'DSP_datasheet' + datetime.datetime.now().strftime(
                     '_%y%m%d_%H%M%S'))
         res_dir.mkdir()
-        for ind, temp in enumerate(self.temp_li):
-            qs_path = res_dir/qs_li[ind]
-            qs_path.mkdir()
-            with pd.ExcelWriter(
-                    str(qs_path/(self.exp_path.name+suffix))) as writer:
-                for dye in self.ch_dict.values():
-                    df = self.rfu_dict[temp][dye]
-                    df = df.reset_index().rename(columns={'index': 'Cycle'})
-                    df.to_excel(writer, sheet_name=dye)
-            self.make_end_point_results(qs_path)
+        self.rfu_cube.meta = {
+            'exp_name': self.exp_path.name, 'version': self.version,
+            'quant_step_li': qs_li,
+            'end_point_well_li': self.get_end_point_well_li()}
+        write_datasheets(self.rfu_cube, res_dir)
+        self.rfu_cube.save(res_dir/RFU_CUBE_NAME)
 
     def get_onef_result(self, tmp, dye, cycle, well, tc=45):
         "save image processing result in image file (by cycle)"
@@ -331,26 +416,22 @@ class SrtRfu32:
 
     def plot_processing_result(self, im_path, cam, col_li, row_li, outf_path,
                                title):
+        from srt_rfu.qc_plot import (
+            plt, label_overlay, crop_rect, plot_ratio_heatmap)
         im_labeled, im_gray = self.label_image(im_path)
-        image_label_overlay = label2rgb(
-            im_labeled, bg_label=0, colors=self.colors_li)
-        region_li = self.get_region_li(im_labeled, im_gray)
+        image_label_overlay = label_overlay(im_labeled)
 
         fig, ax = plt.subplots(2, 3, figsize=(18, 12), constrained_layout=True)
         ax[0, 0].imshow(np.array(Image.open(im_path)))
-        rect = patches.Rectangle(
-            (self.x_range.start, self.y_range.start),
-            self.x_range.stop-self.x_range.start,
-            self.y_range.stop-self.y_range.start,
-            edgecolor='r', facecolor='none')
-        ax[0, 0].add_patch(rect)
+        ax[0, 0].add_patch(crop_rect(self.x_range, self.y_range))
         ax[0, 0].set_title('Original')
         ax[0, 1].imshow(im_gray)
         ax[0, 1].set_title('Gray')
         ax[1, 0].imshow(image_label_overlay)
         ax[1, 0].set_title('Labeled')
         ax[1, 1].imshow(image_label_overlay)
-        region_sum_dict = self.calculate_rfu(region_li, cam, ax[1, 1])
+        region_sum_dict = self.calculate_rfu(
+            self.get_region_stats(im_labeled, im_gray), cam, ax[1, 1])
         ax[1, 1].set_title('Processed Result')
 
         table_cell = []
@@ -369,13 +450,6 @@ class SrtRfu32:
         ax[0, 2].axis('auto')
         ax[0, 2].set_title(title)
 
-        cell_np = np.array(table_cell)
-        data_rt_mean = np.true_divide(cell_np, np.mean(cell_np))
-        boundary = [0, 0.5, 0.7, 0.9, 1.1, 1.3, 1.5, 2]
-        norm = matplotlib.colors.BoundaryNorm(boundary, 7)
-        im, cbar = heatmap(data_rt_mean, row_li, col_li, ax=ax[1, 2],
-                           cmap=plt.get_cmap('coolwarm', 7), norm=norm,
-                           cbarlabel='RFU divided by mean')
-        annotate_heatmap(im, textcolors=['black', 'black'])
+        plot_ratio_heatmap(table_cell, row_li, col_li, ax[1, 2])
         plt.savefig(str(outf_path))
         print(region_sum_dict)
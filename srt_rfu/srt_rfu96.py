@@ -1,23 +1,31 @@
 from srt_rfu.srt_rfu32 import SrtRfu32
-from PIL import Image
+from srt_rfu.rfu_cube import RfuCube
+from srt_rfu.datasheet import RFU_CUBE_NAME, write_datasheets
+from srt_rfu.mp_pool import (
+    as_array, call_worker, get_chunksize, make_shared_array, map_tasks,
+    start_pool)
+from srt_rfu.watch import FrameWatcher
+from collections import OrderedDict
+from itertools import chain, product
+from tqdm import tqdm
 import numpy as np
-import pandas as pd
-import xlsxwriter
 import datetime
+import os
 import pathlib
-from skimage.transform import rotate
+import time
 
 
 class SrtRfu32F(SrtRfu32):
+    # 2: frames are turned by np.rot90 instead of skimage rotate, see
+    # SrtRfu32.open_im
+    ALGORITHM_VERSION = 2
+
     def __init__(self, exp_path, dye_exempt):
         super().__init__(exp_path, dye_exempt)
         self.row_name = list('EFGH')
         self.col_name = [range(1, 5), range(5, 9)]
         self.cam_keys = ['front_left', 'front_right']
-
-    def open_im(self, im_path):
-        im = np.array(Image.open(im_path))
-        return rotate(im[self.y_range, self.x_range], 180)
+        self.rot90_k = 2
 
 
 class SrtRfu32B(SrtRfu32):
@@ -29,15 +37,15 @@ class SrtRfu32B(SrtRfu32):
 
 
 class SrtRfu32S(SrtRfu32):
+    # 2: as SrtRfu32F
+    ALGORITHM_VERSION = 2
+
     def __init__(self, exp_path, dye_exempt):
         super().__init__(exp_path, dye_exempt)
         self.row_name = [list('ABCD'), list('EFGH')]
         self.col_name = range(9, 13)
         self.cam_keys = ['side_front', 'side_back']
-
-    def open_im(self, im_path):
-        im = np.array(Image.open(im_path))
-        return rotate(im[self.y_range, self.x_range], 90)
+        self.rot90_k = 1
 
     def get_well_name4grid(self, i, j, idx):
         return self.row_name[idx][j] + str(self.col_name[i])
@@ -63,6 +71,12 @@ class SrtRfu32S(SrtRfu32):
 
 
 class SrtRfu96:
+    GRID_TASK = 0
+    FRAME_TASK = 1
+    SEGMENT_TASK = 2
+    MASK_TASK = 3
+    DRIFT_TASK = 4
+
     def __init__(self, exp_path, dye_exempt=None):
         self.exp_path = pathlib.Path(exp_path)
         self.rfu_front = SrtRfu32F(self.exp_path, dye_exempt)
@@ -73,59 +87,351 @@ class SrtRfu96:
                          *self.rfu_back.col_name[1],
                          *self.rfu_side.col_name]
 
-    def concat_rfu_table(self, tc=45):
-        self.rfu_front.set_grid(tc=tc)
-        self.rfu_front.make_rfu_table(tc=tc, progress_txt='front progress')
-        self.rfu_back.set_grid(tc=tc)
-        self.rfu_back.make_rfu_table(tc=tc, progress_txt='back progress')
-        self.rfu_side.set_grid(tc=tc)
-        self.rfu_side.make_rfu_table(tc=tc, progress_txt='side progress')
-
-        self.rfu_dict = {}
-        for temp in self.rfu_back.temp_li:
-            self.rfu_dict[temp] = {}
-            for dye in self.rfu_back.ch_dict.values():
-                df_f = self.rfu_front.rfu_dict[temp][dye]
-                df_b = self.rfu_back.rfu_dict[temp][dye]
-                df_s = self.rfu_side.rfu_dict[temp][dye]
-                self.rfu_dict[temp][dye] = pd.concat([df_f, df_b, df_s],
-                                                     axis=1)
-
-    def make_end_point_results(self, path):
-        suffix = ' {} -  End Point Results.xlsx'.format(self.rfu_back.version)
-        well_li = [
-            x+'0'+str(y) for x in self.row_name for y in self.col_name][::-1]
-        with xlsxwriter.Workbook(
-                str(path/(self.exp_path.name+suffix))) as writer:
-            ws = writer.add_worksheet()
-            ws.write(0, 1, 'Well')
-            ws.write(0, 3, 'Content')
-            for i, well in enumerate(well_li):
-                ws.write(i+1, 1, well)
-                ws.write(i+1, 3, 'Unkn')
-
-    def get_datasheet(self, tc=45):
-        "save rfu table as xlsx for DSP analysis"
-        suffix = ' {} -  Quantitation Amplification Results.xlsx'.format(
-            self.rfu_back.version)
+    def concat_rfu_table(self, tc=45, fixed_mask=False):
+        """
+        Get the 96 well RFU table of the front, back and side blocks with
+        one process pool. Grid detection of each camera is queued first,
+        and the frames of a camera follow as soon as its grid is found, so
+        workers never wait at a block boundary. Workers write the RFU
+        straight into the plate array.
+        With `fixed_mask`, grids and well masks are all found first, see
+        set_well_masks, and the pool only sums frames over the masks.
+        """
+        print('Start creating RFU datatable')
+        t = time.time()
+        self.tc = tc
+        block_li = self.get_block_li()
+        n_cam = len(self.rfu_back.cam_keys)
+        plate_well_li = self.init_blocks()
+        n_temp = len(self.rfu_back.temp_li)
+        n_dye = len(self.rfu_back.ch_dict)
+        rfu_buf, rfu_arr = make_shared_array(
+            (n_temp, n_dye, tc, len(plate_well_li)))
+        grid_buf, grid_arr = make_shared_array((len(block_li), n_cam, 16, 4))
+        grid_task_li = [(self.GRID_TASK, block_ind, cam_ind)
+                        for block_ind in range(len(block_li))
+                        for cam_ind in range(n_cam)]
+        if fixed_mask:
+            self.set_well_masks(grid_task_li, grid_buf)
+        n_frame = n_temp*n_dye*tc
+        chunksize = get_chunksize(
+            n_frame*len(grid_task_li), os.cpu_count())
+        with start_pool(self, 'mp_task', shared={
+                'rfu_arr': rfu_buf, 'grid_arr': grid_buf}) as pool, tqdm(
+                    total=len(grid_task_li)*(1+n_frame),
+                    desc='RFU table progress') as pbar:
+            if fixed_mask:
+                cam_it = (task[1:] for task in grid_task_li)
+            else:
+                cam_it = pool.imap_unordered(call_worker, grid_task_li)
+            frame_it_li = []
+            for block_ind, cam_ind in cam_it:
+                pbar.update()
+                frame_task_li = [
+                    (self.FRAME_TASK, block_ind, temp_ind, dye_ind, cycle,
+                     cam_ind) for temp_ind, dye_ind, cycle in product(
+                        range(n_temp), range(n_dye), range(tc))]
+                frame_it_li.append(pool.imap_unordered(
+                    call_worker, frame_task_li, chunksize))
+            for frame_it in frame_it_li:
+                for _ in frame_it:
+                    pbar.update()
+
+        for block_ind, cam_ind in product(range(len(block_li)), range(n_cam)):
+            self.load_grid(block_ind, cam_ind, grid_arr)
+        self.rfu_cube = RfuCube(
+            self.rfu_back.temp_li, self.rfu_back.ch_dict.values(),
+            range(1, tc+1), plate_well_li, data=rfu_arr)
+        if fixed_mask:
+            self.report_drift(tc)
+        self.rfu_dict = self.rfu_cube.to_rfu_dict()
+        print('\nFinish creating RFU table in {} sec.'.format(time.time()-t))
+
+    def set_well_masks(self, grid_task_li, grid_buf):
+        """
+        Fixed mask mode, see SrtRfu32.set_well_masks: the grid of every
+        camera, then the well masks of every camera and dye, set on the
+        blocks so that the frame pool inherits them.
+        """
+        map_tasks(self, 'mp_task', grid_task_li, 'Grid progress',
+                  shared={'grid_arr': grid_buf})
+        for _, block_ind, cam_ind in grid_task_li:
+            self.load_grid(block_ind, cam_ind, as_array(grid_buf))
+        mask_task_li = [
+            (self.MASK_TASK, block_ind, dye_ind, cam_ind)
+            for _, block_ind, cam_ind in grid_task_li
+            for dye_ind in range(len(self.rfu_back.ch_dict))]
+        mask_li = map_tasks(self, 'mp_task', mask_task_li,
+                            'Well mask progress')
+        for (_, block_ind, dye_ind, cam_ind), mask in zip(
+                mask_task_li, mask_li):
+            self.get_block_li()[block_ind].well_mask[
+                (dye_ind, cam_ind)] = mask
+
+    def report_drift(self, tc):
+        "SrtRfu32.report_drift over the whole plate"
+        task_li = [
+            (self.DRIFT_TASK, block_ind, *sample)
+            for block_ind, block in enumerate(self.get_block_li())
+            for sample in block.get_drift_sample_li(tc)]
+        rfu_li = map_tasks(self, 'mp_task', task_li, 'Drift check progress')
+        self.drift_report = OrderedDict()
+        for task, rfu_dic in zip(task_li, rfu_li):
+            self.get_block_li()[task[1]].add_drift(
+                self.drift_report, task[2:], rfu_dic, self.rfu_cube)
+        self.rfu_back.print_drift_report(self.drift_report)
+
+    def watch_rfu_table(self, tc=45, poll_sec=0.5, timeout=600):
+        """
+        concat_rfu_table for a run in progress. Frames are segmented as soon
+        as the instrument has written them. A camera's grid comes from its
+        last cycle, so meanwhile its frames are assigned to wells by a
+        provisional grid of its first frame. The region statistics of the
+        frames are kept in this process, where assigning them to wells is
+        cheap, and are assigned again if the last cycle moves the grid.
+        self.rfu_cube holds the partial table meanwhile, NaN for the frames
+        still to come or whose camera has no grid yet.
+        """
+        print('Start watching {}'.format(self.exp_path))
+        self.tc = tc
+        block_li = self.get_block_li()
+        n_cam = len(self.rfu_back.cam_keys)
+        n_temp = len(self.rfu_back.temp_li)
+        n_dye = len(self.rfu_back.ch_dict)
+        plate_well_li = self.init_blocks()
+        task_dict = OrderedDict()
+        for cycle, temp_ind, dye_ind, block_ind, cam_ind in product(
+                range(tc), range(n_temp), range(n_dye), range(len(block_li)),
+                range(n_cam)):
+            task_dict[block_li[block_ind].get_frame_path(
+                temp_ind, dye_ind, cycle, cam_ind)] = (
+                    self.SEGMENT_TASK, block_ind, temp_ind, dye_ind, cycle,
+                    cam_ind)
+        grid_task_dict = {}
+        for block_ind, cam_ind in product(range(len(block_li)), range(n_cam)):
+            grid_task_dict[block_li[block_ind].get_grid_im_path(
+                cam_ind, tc)] = (self.GRID_TASK, block_ind, cam_ind)
+        # region statistics of every frame of the cameras whose last cycle
+        # grid is still unknown
+        waiting = {cam: [] for cam in product(range(len(block_li)),
+                                              range(n_cam))}
+        # cameras assigned by a provisional grid, and those to get one
+        provisional = {}
+        to_guess = set(waiting)
+        frame_it = iter(FrameWatcher(task_dict, poll_sec, timeout))
+        first_path = next(frame_it)
+        t = time.time()
+
+        grid_buf, grid_arr = make_shared_array((len(block_li), n_cam, 16, 4))
+        guess_buf, guess_arr = make_shared_array(
+            (len(block_li), n_cam, 16, 4))
+        with start_pool(self, 'mp_task', shared={
+                'grid_arr': grid_buf,
+                'provisional_grid_arr': guess_buf}) as pool, tqdm(
+                    total=len(task_dict)+len(grid_task_dict),
+                    desc='RFU table progress') as pbar:
+            self.rfu_cube = RfuCube(
+                self.rfu_back.temp_li, self.rfu_back.ch_dict.values(),
+                range(1, tc+1), plate_well_li, dtype=np.float64)
+            self.rfu_cube.data[:] = np.nan
+            for block_ind, block in enumerate(block_li):
+                block.rfu_arr = self.rfu_cube.data[
+                    ..., self.block_well_range[block_ind]]
+
+            # callbacks all run in the pool's result thread, one at a time.
+            # An exception would end that thread and leave res.get() waiting
+            # forever, so the first one is kept and raised after the tasks
+            callback_err = []
+
+            def guard(callback):
+                def call(res):
+                    if callback_err:
+                        return
+                    try:
+                        callback(res)
+                    except Exception as err:
+                        callback_err.append(err)
+                return call
+
+            def on_provisional_grid(cam):
+                if cam not in waiting:
+                    return
+                self.load_grid(*cam, guess_arr)
+                provisional[cam] = self.get_grid(*cam)
+                for key, region_stats in waiting[cam]:
+                    self.assign_frame(key, region_stats)
+
+            def on_grid(cam):
+                self.load_grid(*cam, grid_arr)
+                stats_li = waiting.pop(cam)
+                if self.get_grid(*cam) != provisional.get(cam):
+                    if cam in provisional:
+                        print('\nGrid of camera {} moved by its last cycle, '
+                              'assigning its frames again'.format(cam))
+                    for key, region_stats in stats_li:
+                        self.assign_frame(key, region_stats)
+                pbar.update()
+
+            def on_segment(res):
+                key, region_stats = res
+                cam = (key[0], key[-1])
+                if cam in waiting:
+                    waiting[cam].append(res)
+                if cam in provisional or cam not in waiting:
+                    self.assign_frame(key, region_stats)
+                pbar.update()
+
+            res_li = []
+            for im_path in chain([first_path], frame_it):
+                block_ind, cam_ind = (task_dict[im_path][1],
+                                      task_dict[im_path][-1])
+                if (block_ind, cam_ind) in to_guess:
+                    to_guess.remove((block_ind, cam_ind))
+                    if im_path not in grid_task_dict:
+                        res_li.append(pool.apply_async(
+                            call_worker, ((self.GRID_TASK, block_ind,
+                                           cam_ind, im_path),),
+                            callback=guard(on_provisional_grid)))
+                if im_path in grid_task_dict:
+                    res_li.append(pool.apply_async(
+                        call_worker, (grid_task_dict[im_path],),
+                        callback=guard(on_grid)))
+                res_li.append(pool.apply_async(
+                    call_worker, (task_dict[im_path],),
+                    callback=guard(on_segment)))
+            for res in res_li:
+                res.get()
+            if callback_err:
+                raise callback_err[0]
+        self.rfu_dict = self.rfu_cube.to_rfu_dict()
+        print('\nFinish creating RFU table in {} sec. after the first '
+              'frame'.format(time.time()-t))
+
+    def init_blocks(self):
+        """
+        Set the well order of each block and its range in the plate.
+        Returns the plate well list.
+        """
+        n_cam = len(self.rfu_back.cam_keys)
+        plate_well_li = []
+        self.block_well_range = []
+        for block in self.get_block_li():
+            block.well_li = sorted(
+                well for idx in range(n_cam)
+                for well in block.get_grid_well_li(idx))
+            block.well_ind = {
+                well: i for i, well in enumerate(block.well_li)}
+            block.grid = {}
+            self.block_well_range.append(slice(
+                len(plate_well_li), len(plate_well_li)+len(block.well_li)))
+            plate_well_li += block.well_li
+        return plate_well_li
+
+    def get_block_li(self):
+        return [self.rfu_front, self.rfu_back, self.rfu_side]
+
+    def set_cache(self, rfu_cache):
+        "share one RfuCache among the blocks"
+        for block in self.get_block_li():
+            block.rfu_cache = rfu_cache
+
+    def mp_task(self, task_kind, block_ind, *args):
+        if task_kind == self.GRID_TASK:
+            return self.mp_grid(block_ind, *args)
+        if task_kind == self.SEGMENT_TASK:
+            return self.mp_segment(block_ind, *args)
+        if task_kind == self.MASK_TASK:
+            return self.get_block_li()[block_ind].get_well_mask(
+                *args, self.tc)
+        if task_kind == self.DRIFT_TASK:
+            return self.get_block_li()[block_ind].mp_drift(*args)
+        return self.mp_frame(block_ind, *args)
+
+    def mp_grid(self, block_ind, cam_ind, im_path=None):
+        """
+        find the grid of a camera and share it with the other workers.
+        With `im_path`, a provisional grid of that frame goes to
+        provisional_grid_arr instead, or None if no well is lit yet.
+        """
+        block = self.get_block_li()[block_ind]
+        if im_path is None:
+            grid_arr = self.grid_arr
+            grid = block.set_grid_single(
+                block.get_grid_im_path(cam_ind, self.tc), cam_ind)
+        else:
+            grid_arr = self.provisional_grid_arr
+            try:
+                grid = block.set_grid_single(im_path, cam_ind)
+            except ValueError:
+                # no region to span the grid, the camera waits for its
+                # last cycle
+                return None
+        # rows in the order load_grid reads them, dicts of Python 3.5 are
+        # not ordered
+        grid_arr[block_ind, cam_ind] = [
+            grid[well] for well in block.get_grid_well_li(cam_ind)]
+        return block_ind, cam_ind
+
+    def mp_frame(self, block_ind, temp_ind, dye_ind, cycle, cam_ind):
+        block = self.get_block_li()[block_ind]
+        if block.cam_keys[cam_ind] not in block.grid:
+            self.load_grid(block_ind, cam_ind, self.grid_arr)
+        block.rfu_arr = self.rfu_arr[..., self.block_well_range[block_ind]]
+        block.mp_rfu(temp_ind, dye_ind, cycle, cam_ind)
+
+    def mp_segment(self, block_ind, temp_ind, dye_ind, cycle, cam_ind):
+        "region statistics of a frame, for a camera grid not known yet"
+        block = self.get_block_li()[block_ind]
+        region_stats = block.segment_frame(
+            block.get_frame_path(temp_ind, dye_ind, cycle, cam_ind))
+        return (block_ind, temp_ind, dye_ind, cycle, cam_ind), region_stats
+
+        "RFU of a segmented frame into rfu_arr of its block, by its grid"
+        "RFU of a segmented frame into the block's rfu_arr, once its grid is set"
+        block_ind, temp_ind, dye_ind, cycle, cam_ind = key
+        block = self.get_block_li()[block_ind]
+        block.store_rfu((temp_ind, dye_ind, cycle), block.calculate_rfu(
+            region_stats, block.cam_keys[cam_ind]))
+
+    def load_grid(self, block_ind, cam_ind, grid_arr):
+        block = self.get_block_li()[block_ind]
+        block.grid[block.cam_keys[cam_ind]] = dict(zip(
+            block.get_grid_well_li(cam_ind),
+            grid_arr[block_ind, cam_ind].tolist()))
+
+    def get_grid(self, block_ind, cam_ind):
+        block = self.get_block_li()[block_ind]
+        return block.grid[block.cam_keys[cam_ind]]
+
+    def get_end_point_well_li(self):
+        return [x+'0'+str(y) for x in self.row_name
+                for y in self.col_name][::-1]
+
+    def get_datasheet(self, tc=45, watch=False, fixed_mask=False):
+        """save rfu table as xlsx for DSP analysis.
+        With `watch`, frames are processed while the run is in progress.
+        With `fixed_mask`, frames are summed over the well masks of the last
+        cycle instead of being segmented, see SrtRfu32.set_well_masks"""
         qs_li = ['QuantStep60', 'QuantStep72']
-        self.concat_rfu_table(tc=tc)
+        if watch and fixed_mask:
+            raise ValueError('fixed mask mode needs the last cycle, so it '
+                             'cannot watch a run in progress')
+        if watch:
+            self.watch_rfu_table(tc=tc)
+        else:
+            self.concat_rfu_table(tc=tc, fixed_mask=fixed_mask)
         res_dir = self.exp_path/'DSP_datasheet'
         if res_dir.exists():
             res_dir = self.exp_path/(
                 'DSP_datasheet' + datetime.datetime.now().strftime(
                     '_%y%m%d_%H%M%S'))
         res_dir.mkdir()
-        for ind, temp in enumerate(self.rfu_back.temp_li):
-            qs_path = res_dir/qs_li[ind]
-            qs_path.mkdir()
-            with pd.ExcelWriter(
-                    str(qs_path/(self.exp_path.name+suffix))) as writer:
-                for dye in self.rfu_back.ch_dict.values():
-                    df = self.rfu_dict[temp][dye]
-                    df = df.reset_index().rename(columns={'index': 'Cycle'})
-                    df.to_excel(writer, sheet_name=dye)
-            self.make_end_point_results(qs_path)
+        self.rfu_cube.meta = {
+            'exp_name': self.exp_path.name, 'version': self.rfu_back.version,
+            'quant_step_li': qs_li,
+            'end_point_well_li': self.get_end_point_well_li()}
+        write_datasheets(self.rfu_cube, res_dir)
+        self.rfu_cube.save(res_dir/RFU_CUBE_NAME)
 
     def get_onef_result(self, tmp, dye, cycle, well, tc=45):
         col = int(well[1:])
@@ -0,0 +1,269 @@
+import json
+import pathlib
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+
+# (rows, cols) of a full camera frame, every engine crops inside it
+FRAME_SHAPE = (2464, 3280)
+DUMMY_PATH = pathlib.Path(__file__).resolve().parent.parent/'dummy_data'
+# curves of the Low Temp and High Temp steps of a run, and of a melt step
+QUANT_CURVE_LI = ['QuantStep4/q4.json', 'QuantStep5/q5.json']
+MELT_CURVE = 'MeltStep8/melt.json'
+# well lattice and pixel levels of the rendered frames
+WELL_PITCH = 300
+WELL_RADIUS = 100
+BACKGROUND = 12
+WELL_MAX = 210
+# a well is dimmer towards its rim by up to WELL_FALLOFF, in N_RING rings
+WELL_FALLOFF = 0.25
+N_RING = 4
+NOISE_SIGMA = 3.0
+N_NOISE = 32
+JPEG_QUALITY = 90
+# camera response to each dye as RGB weights
+DYE_COLOR = {
+    'FAM': (0.35, 1.0, 0.45),
+    'HEX': (0.8, 1.0, 0.3),
+    'Cal Red 610': (1.0, 0.35, 0.3),
+    'Quasar 670': (1.0, 0.2, 0.35),
+    'Quasar 705': (0.9, 0.15, 0.4),
+}
+
+
+def load_curves(path):
+    """
+    curves of a dummy_data json as {dye: {well: values by cycle}}, without
+    the Cycle pseudo well
+    """
+    with open(str(path), 'r') as f:
+        raw = json.load(f)
+    curves = {}
+    for dye, well_dic in raw.items():
+        curves[dye] = {
+            well: np.array([val for _, val in sorted(
+                cycle_dic.items(), key=lambda tup: int(tup[0]))])
+            for well, cycle_dic in well_dic.items() if well != 'Cycle'}
+    return curves
+
+
+class SynthCurves:
+    """
+    Well levels of the rendered frames by step, dye, well and cycle, taken
+    from the dummy_data curves.
+    All steps share one scale, the highest value of any curve being
+    WELL_MAX, so that the dyes and steps keep their relative brightness.
+    A well without a curve is a blank well at the lowest first cycle value
+    of its dye, and cycles past the end of a curve repeat its last value.
+    @params:
+        path_li     - Optional  : curve files relative to dummy_data, one
+                                  per step. default is QUANT_CURVE_LI (List)
+    """
+
+    def __init__(self, path_li=None):
+        self.curve_li = [load_curves(DUMMY_PATH/path)
+                         for path in path_li or QUANT_CURVE_LI]
+        self.peak = max(
+            curve.max() for curves in self.curve_li
+            for well_dic in curves.values() for curve in well_dic.values())
+
+    def has_dye(self, dye):
+        return all(dye in curves for curves in self.curve_li)
+
+    def get_dye_exempt(self, ch_dict):
+        "abbreviations of the dyes of an engine that have no curves"
+        return [abb for abb, dye in ch_dict.items() if not self.has_dye(dye)]
+
+    def get_cycle_count(self, step_ind):
+        well_dic = next(iter(self.curve_li[step_ind].values()))
+        return len(next(iter(well_dic.values())))
+
+    def get_levels(self, step_ind, dye, well_li, cycle):
+        "pixel level of each well of well_li at a cycle (ndarray)"
+        well_dic = self.curve_li[step_ind][dye]
+        blank = min(curve[0] for curve in well_dic.values())
+        val = np.array([
+            well_dic[well][min(cycle, len(well_dic[well])-1)]
+            if well in well_dic else blank for well in well_li])
+        return BACKGROUND + (WELL_MAX - BACKGROUND)*val/self.peak
+
+
+def get_lattice_box(view_shape):
+    "(y_min, x_min, y_max, x_max) of 4x4 WELL_PITCH cells centered in a view"
+    half = 2*WELL_PITCH
+    cent_y, cent_x = view_shape[0]//2, view_shape[1]//2
+    return (cent_y-half, cent_x-half, cent_y+half, cent_x+half)
+
+
+def get_lattice(view_shape, get_name, well_box=None):
+    """
+    centers of a 4x4 well lattice by well name, in view coordinates.
+    get_name(i, j) names the well of column i and row j, like the
+    get_well_name4grid of the engines. The lattice fills well_box
+    (y_min, x_min, y_max, x_max), by default get_lattice_box.
+    """
+    if well_box is None:
+        well_box = get_lattice_box(view_shape)
+    y_min, x_min, y_max, x_max = well_box
+    center_dict = OrderedDict()
+    for i in range(4):
+        for j in range(4):
+            center_dict[get_name(i, j)] = (
+                y_min + (y_max-y_min)*(j+0.5)/4,
+                x_min + (x_max-x_min)*(i+0.5)/4)
+    return center_dict
+
+
+def get_block_layout_li(block, shape=FRAME_SHAPE):
+    """
+    (camera folder, WellLayout) of every camera of a SrtRfu32 block, wells
+    placed where set_grid_single finds its grid
+    """
+    layout_li = []
+    for idx, cam in enumerate(block.cam_keys):
+        layout = WellLayout(shape, block.y_range, block.x_range,
+                            block.rot90_k)
+        layout.set_wells(get_lattice(
+            layout.view_shape,
+            lambda i, j: block.get_well_name4grid(i, j, idx)))
+        layout_li.append((cam, layout))
+    return layout_li
+
+
+class WellLayout:
+    """
+    Wells of one camera frame: disks of WELL_RADIUS on an engine's view of
+    the frame, which is its crop turned by rot90_k quarter turns like
+    SrtRfu32.open_im.
+    Pixels are coded by well, ring and noise sample once, so that a frame
+    is rendered by three table lookups.
+    @params:
+        shape       - Required  : (rows, cols) of the frame (Tuple)
+        y_range     - Optional  : rows of the engine's crop (slice)
+        x_range     - Optional  : columns of the engine's crop (slice)
+        rot90_k     - Optional  : quarter turns of the engine's view (Int)
+        seed        - Optional  : seed of the noise (Int)
+    """
+
+    def __init__(self, shape=FRAME_SHAPE, y_range=slice(None),
+                 x_range=slice(None), rot90_k=0, seed=0):
+        self.shape = tuple(shape)
+        self.y_range = slice(*y_range.indices(shape[0])[:2])
+        self.x_range = slice(*x_range.indices(shape[1])[:2])
+        self.rot90_k = rot90_k
+        crop_shape = (self.y_range.stop - self.y_range.start,
+                      self.x_range.stop - self.x_range.start)
+        self.view_shape = crop_shape[::-1] if rot90_k % 2 else crop_shape
+        self.rng = np.random.RandomState(seed)
+        self.noise = np.sort(self.rng.normal(0, NOISE_SIGMA, N_NOISE))
+        self.noise_ind = self.rng.randint(
+            N_NOISE, size=self.shape).astype(np.uint16)
+        self.well_li = []
+        self.code = self.noise_ind
+
+    def to_frame(self, view_arr):
+        "array of the view placed in a zero frame"
+        frame_arr = np.zeros(self.shape, dtype=view_arr.dtype)
+        frame_arr[self.y_range, self.x_range] = np.rot90(
+            view_arr, -self.rot90_k)
+        return frame_arr
+
+    def set_wells(self, center_dict):
+        "draw the wells at their centers in view coordinates (Dict)"
+        self.well_li = list(center_dict.keys())
+        view = np.zeros(self.view_shape, dtype=np.uint16)
+        r = WELL_RADIUS
+        for ind, (cent_y, cent_x) in enumerate(center_dict.values()):
+            y0, x0 = int(round(cent_y)) - r, int(round(cent_x)) - r
+            dy = np.arange(2*r+1)[:, None] + y0 - cent_y
+            dx = np.arange(2*r+1)[None, :] + x0 - cent_x
+            r2 = (dy*dy + dx*dx)/(r*r)
+            ring = np.minimum((r2*N_RING).astype(np.uint16), N_RING-1)
+            view[y0:y0+2*r+1, x0:x0+2*r+1][r2 <= 1] = (
+                1 + ind*N_RING + ring[r2 <= 1])
+        self.code = self.to_frame(view)*N_NOISE + self.noise_ind
+
+    def set_plate(self, well_box):
+        """
+        draw one bright box in view coordinates instead of wells, like the
+        plate of the ref.jpg a 16 well grid is found from
+        """
+        self.well_li = ['plate']
+        view = np.zeros(self.view_shape, dtype=np.uint16)
+        y_min, x_min, y_max, x_max = [int(val) for val in well_box]
+        view[y_min:y_max, x_min:x_max] = 1
+        self.code = self.to_frame(view)*N_NOISE + self.noise_ind
+
+    def render(self, level_arr, dye):
+        """
+        RGB frame with each well at its level, in the order of well_li.
+        The noise samples are rotated by a random shift, so every frame has
+        different noise.
+        """
+        falloff = 1 - WELL_FALLOFF*(np.arange(N_RING) + 0.5)/N_RING
+        level = np.concatenate([
+            [BACKGROUND], (np.asarray(level_arr)[:, None]*falloff).ravel()])
+        noise = np.roll(self.noise, self.rng.randint(N_NOISE))
+        channel_li = []
+        for weight in DYE_COLOR[dye]:
+            lut = np.clip(level[:, None]*weight + noise, 0, 255)
+            channel_li.append(np.round(lut).astype(np.uint8).ravel()[
+                self.code])
+        return np.dstack(channel_li)
+
+    def save(self, path, level_arr, dye):
+        Image.fromarray(self.render(level_arr, dye)).save(
+            str(path), quality=JPEG_QUALITY)
+
+
+def write_cycle_frames(cam_dir, layout, curves, ch_dict, tc):
+    """
+    frames '<cycle>_<temp>_<dye>.jpg' of a camera, a temperature by step of
+    curves. Dyes without curves are skipped.
+    Returns the number of frames written.
+    """
+    cam_dir = pathlib.Path(cam_dir)
+    cam_dir.mkdir(parents=True, exist_ok=True)
+    n_frame = 0
+    for temp_ind in range(len(curves.curve_li)):
+        for abb, dye in ch_dict.items():
+            if not curves.has_dye(dye):
+                continue
+            for cycle in range(tc):
+                layout.save(
+                    cam_dir/'{}_{}_{}.jpg'.format(cycle, temp_ind, abb),
+                    curves.get_levels(temp_ind, dye, layout.well_li, cycle),
+                    dye)
+                n_frame += 1
+    return n_frame
+
+
+def write_step_frames(step_dir, layout, curves, step_ind, ch_dict, tc=None):
+    """
+    frames '<dye>_<cycle>.jpg' of a step, the folder layout of ExpRfu.
+    Writes every cycle of the curves, or the first tc.
+    Returns the number of frames written.
+    """
+    step_dir = pathlib.Path(step_dir)
+    step_dir.mkdir(parents=True, exist_ok=True)
+    n_cycle = curves.get_cycle_count(step_ind)
+    n_frame = 0
+    for abb, dye in ch_dict.items():
+        if not curves.has_dye(dye):
+            continue
+        for cycle in range(min(n_cycle, tc or n_cycle)):
+            layout.save(
+                step_dir/'{}_{}.jpg'.format(abb, cycle),
+                curves.get_levels(step_ind, dye, layout.well_li, cycle), dye)
+            n_frame += 1
+    return n_frame
+
+
+def write_ref_frame(cam_dir, layout, well_box):
+    "ref.jpg of a 16 well camera, whose bright plate box spans the grid"
+    plate = WellLayout(layout.shape, layout.y_range, layout.x_range,
+                       layout.rot90_k)
+    plate.set_plate(well_box)
+    cam_dir = pathlib.Path(cam_dir)
+    cam_dir.mkdir(parents=True, exist_ok=True)
+    plate.save(cam_dir/'ref.jpg', [WELL_MAX], 'FAM')
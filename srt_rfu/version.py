@@ -0,0 +1,37 @@
+import pathlib
+import subprocess
+
+# replaced with the short commit hash by `git archive` through the
+# export-subst attribute in .gitattributes
+BUILD_STAMP = '$Format:%h$'
+
+# version of this process, resolved on the first get_version call
+_version = {}
+
+
+def get_version():
+    """
+    Short commit hash of the source tree, resolved once per process.
+    git is asked in the directory of this package, so the working directory
+    does not matter. Outside a checkout, e.g. an exported tree, the build
+    stamp is used, and 'unknown' if neither is available.
+    """
+    if 'version' not in _version:
+        _version['version'] = read_git_version() or read_build_stamp()
+    return _version['version']
+
+
+def read_git_version():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=str(pathlib.Path(__file__).resolve().parent),
+            stderr=subprocess.DEVNULL).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def read_build_stamp():
+    if BUILD_STAMP.startswith('$Format'):
+        return 'unknown'
+    return BUILD_STAMP
@@ -0,0 +1,108 @@
+import os
+import pathlib
+import re
+import shutil
+import time
+from collections import OrderedDict
+
+# last two bytes of every complete JPEG file
+JPEG_EOI = b'\xff\xd9'
+# {cycle}_{temp}_{dye}.jpg, as written by the instrument
+FRAME_PATTERN = re.compile(r'^(\d+)_(\d+)_(\w+)\.jpg$')
+
+
+def is_jpeg_complete(im_path):
+    "whether a JPEG file is written up to its end of image marker"
+    try:
+        with open(str(im_path), 'rb') as f:
+            f.seek(-len(JPEG_EOI), os.SEEK_END)
+            return f.read() == JPEG_EOI
+    except OSError:
+        return False
+
+
+class FrameWatcher:
+    """
+    Follows frames that the instrument is about to write and reports each one
+    as soon as it is completely written, i.e. its size did not change between
+    two polls and it ends with the JPEG end of image marker.
+    @params:
+        path_li     - Required  : expected frame paths (List)
+        poll_sec    - Optional  : seconds between two directory polls (Float)
+        timeout     - Optional  : seconds without a new frame before giving
+                                  up, None waits forever (Float)
+    """
+
+    def __init__(self, path_li, poll_sec=0.5, timeout=600):
+        # expected path -> size at the last poll
+        self.pending = OrderedDict(
+            (pathlib.Path(p), None) for p in path_li)
+        self.poll_sec = poll_sec
+        self.timeout = timeout
+
+    def poll(self):
+        "frames completed since the last poll, in the expected order"
+        done_li = []
+        for im_path, last_size in self.pending.items():
+            try:
+                size = os.stat(str(im_path)).st_size
+            except FileNotFoundError:
+                continue
+            if size == last_size and is_jpeg_complete(im_path):
+                done_li.append(im_path)
+            else:
+                self.pending[im_path] = size
+        for im_path in done_li:
+            del self.pending[im_path]
+        return done_li
+
+    def __iter__(self):
+        last = time.time()
+        while self.pending:
+            done_li = self.poll()
+            if done_li:
+                last = time.time()
+            elif self.timeout is not None and (
+                    time.time() - last > self.timeout):
+                raise TimeoutError('{} frames not written in {} sec, e.g. '
+                                   '{}'.format(len(self.pending), self.timeout,
+                                               next(iter(self.pending))))
+            for im_path in done_li:
+                yield im_path
+            if self.pending:
+                time.sleep(self.poll_sec)
+
+
+def replay_frames(src_path, dst_path, cycle_sec=1.0, chunk_size=1 << 16):
+    """
+    Copy the frames of a finished run into a new directory at instrument
+    cadence, to test the watch modes without an instrument.
+    Other files, e.g. grid.json and ref.jpg, are copied first. Frames follow
+    cycle by cycle, `cycle_sec` apart, and each frame is written in chunks so
+    that readers see partially written files like they do on the instrument.
+    """
+    src_path = pathlib.Path(src_path)
+    dst_path = pathlib.Path(dst_path)
+    frame_li = []
+    for src in sorted(src_path.rglob('*')):
+        if src.is_dir():
+            continue
+        dst = dst_path/src.relative_to(src_path)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        match = FRAME_PATTERN.match(src.name)
+        if match:
+            frame_li.append((int(match.group(1)), int(match.group(2)),
+                             src, dst))
+        else:
+            shutil.copyfile(str(src), str(dst))
+    frame_li.sort(key=lambda frame: frame[:2])
+
+    cycle_start = time.time()
+    for ind, (cycle, _, src, dst) in enumerate(frame_li):
+        if ind and cycle != frame_li[ind-1][0]:
+            time.sleep(max(0, cycle_start + cycle_sec - time.time()))
+            cycle_start = time.time()
+        with open(str(src), 'rb') as f_src, open(str(dst), 'wb') as f_dst:
+            for chunk in iter(lambda: f_src.read(chunk_size), b''):
+                f_dst.write(chunk)
+                f_dst.flush()
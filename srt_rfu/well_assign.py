@@ -0,0 +1,64 @@
+import numpy as np
+
+
+def assign_wells(grid, y, x):
+    """
+    Well of every region of a frame at once, from the region centroids.
+    A region is in the grid rectangle of the first well that strictly
+    contains its centroid, the first region of a rectangle sets the center
+    of it, and a region counts for the first well containing it whose
+    radius, half the rectangle width less 50 pixels, is larger than its
+    distance to that center. This is the assignment calculate_rfu made
+    region by region, vectorized over the regions of the frame.
+    @params:
+        grid        - Required  : well -> (y_min, x_min, y_max, x_max) (Dict)
+        y           - Required  : centroid rows of the regions (ndarray)
+        x           - Required  : centroid columns of the regions (ndarray)
+    Returns the wells in grid order, then by region the index of its
+    rectangle and of its well (-1 for none), and by rectangle the index of
+    the region that set its center (-1 for none) and its well radius.
+    """
+    well_li = list(grid.keys())
+    y = np.asarray(y, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    box = np.array([grid[well] for well in well_li],
+                   dtype=np.float64).reshape(-1, 4)
+    y_min, x_min, y_max, x_max = (box[:, i, None] for i in range(4))
+    radius = (box[:, 3] - box[:, 1])/2 - 50
+
+    # inside[well, region]
+    inside = (y_min < y) & (y < y_max) & (x_min < x) & (x < x_max)
+    rect_ind = first_true(inside)
+
+    center_ind = np.full(len(well_li), -1, dtype=np.intp)
+    in_rect = np.flatnonzero(rect_ind >= 0)
+    rect, first = np.unique(rect_ind[in_rect], return_index=True)
+    center_ind[rect] = in_rect[first]
+
+    dx = x - x[center_ind[rect_ind]]
+    dy = y - y[center_ind[rect_ind]]
+    distance = np.sqrt(dx*dx + dy*dy)
+    well_ind = first_true(inside & (distance < radius[:, None]))
+    return well_li, rect_ind, well_ind, center_ind, radius
+
+
+def first_true(mask):
+    "row index of the first True of every column of a 2D mask, -1 for none"
+    if not mask.shape[0]:
+        return np.full(mask.shape[1], -1, dtype=np.intp)
+    return np.where(mask.any(axis=0), mask.argmax(axis=0), -1)
+
+
+def plot_assignment(ax, y, x, well_li, rect_ind, well_ind, center_ind,
+                    radius):
+    "QC plot of the regions of a frame by well and of the well circles"
+    from srt_rfu.qc_plot import well_circle
+    for ind in np.flatnonzero(rect_ind >= 0):
+        if well_ind[ind] >= 0:
+            ax.plot(x[ind], y[ind], color='white', marker='*')
+            ax.text(x[ind], y[ind], well_li[well_ind[ind]], color='gray')
+        else:
+            ax.plot(x[ind], y[ind], color='b', marker='x')
+    for ind in center_ind[center_ind >= 0]:
+        if well_ind[ind] >= 0:
+            ax.add_artist(well_circle([x[ind], y[ind]], radius[well_ind[ind]]))
@@ -0,0 +1,6 @@
+import pathlib
+import sys
+
+# the srt_rfu package and the exp2rfu scripts are imported from the
+# repository root, like the scripts themselves do
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+import exp2rfu_v2
+import exp2rfu_v3
+from exp2rfu import ExpRfu2Base, get_rect_sums
+
+
+def get_rect_li(shape, rng, n_rect):
+    "random rectangles, some empty, off the image or on its edges"
+    rect_arr = np.concatenate([
+        np.sort(rng.randint(-20, shape[0] + 20, (n_rect, 2)), axis=1),
+        np.sort(rng.randint(-20, shape[1] + 20, (n_rect, 2)), axis=1),
+    ], axis=1)[:, [0, 2, 1, 3]]
+    edge_arr = np.array([[0, 0, shape[0], shape[1]], [5, 5, 5, 9],
+                         [0, shape[1] - 1, 1, shape[1]]])
+    return np.concatenate([rect_arr, edge_arr])
+
+
+@pytest.mark.parametrize('shape, dtype', [
+    ((40, 50), np.uint8), ((40, 50, 3), np.uint8), ((1, 1), np.uint8),
+    ((37, 61), np.int64)])
+def test_matches_slice_sums(shape, dtype):
+    rng = np.random.RandomState(len(shape))
+    im = rng.randint(0, 256, shape).astype(dtype)
+    rect_arr = get_rect_li(shape, rng, 30)
+    expected = [im[y0:y1, x0:x1].sum(dtype=np.int64) for y0, x0, y1, x1 in
+                np.clip(rect_arr, 0, shape[:2]*2)]
+    res = get_rect_sums(im, rect_arr)
+    assert res.dtype == np.int64
+    assert res.tolist() == expected
+
+
+def test_uint8_sums_do_not_overflow():
+    im = np.full((3000, 40), 255, dtype=np.uint8)
+    assert get_rect_sums(im, np.array([[0, 0, 3000, 40]])).tolist() == [
+        255*3000*40]
+
+
+def test_run_classes_list_their_images(tmp_path):
+    "ExpRfu2Base is abstract, only a class that lists its images is a run"
+    with pytest.raises(TypeError):
+        ExpRfu2Base(tmp_path)
+    for module in (exp2rfu_v2, exp2rfu_v3):
+        assert isinstance(module.ExpRfu2(tmp_path), ExpRfu2Base)
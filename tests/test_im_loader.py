@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from PIL import Image
+from srt_rfu.im_loader import open_roi
+
+SHAPE = (600, 800)
+ROI_LI = [(0, 1), (3, 16), (0, 200), (100, 333), (0, 584), (50, None)]
+
+
+@pytest.fixture(params=[0, 2], ids=['444', '420'])
+def jpeg_path(tmp_path, request):
+    rng = np.random.RandomState(0)
+    arr = (np.add.outer(np.arange(SHAPE[0]), np.arange(SHAPE[1]))[
+        ..., None] * [1, 2, 3] % 256)
+    arr = np.clip(arr + rng.randint(0, 60, arr.shape), 0, 255)
+    path = tmp_path/'frame.jpg'
+    Image.fromarray(arr.astype(np.uint8)).save(
+        str(path), quality=85, subsampling=request.param)
+    return path
+
+
+@pytest.mark.parametrize('luma', [False, True])
+def test_open_roi_matches_full_decode(jpeg_path, luma):
+    im = Image.open(str(jpeg_path))
+    if luma:
+        im.draft('L', im.size)
+    full = np.array(im)
+    for y_start, y_stop in ROI_LI:
+        roi = open_roi(jpeg_path, slice(y_start, y_stop), slice(5, 700),
+                       luma)
+        assert np.array_equal(roi, full[y_start:y_stop, 5:700])
+
+
+def get_scan_start(path):
+    data = path.read_bytes()
+    return data, data.index(b'\xff\xda')
+
+
+def assert_fails_like_full_decode(path):
+    with pytest.raises(OSError):
+        Image.open(str(path)).load()
+    for y_stop in (1, 200, 400):
+        with pytest.raises(OSError):
+            open_roi(path, slice(0, y_stop))
+
+
+def test_open_roi_fails_on_a_marker_in_the_scan(jpeg_path):
+    data, sos = get_scan_start(jpeg_path)
+    for pos in np.linspace(sos + 20, len(data) - 20, 7).astype(int):
+        jpeg_path.write_bytes(data[:pos] + b'\xff\xd8' + data[pos+2:])
+        assert_fails_like_full_decode(jpeg_path)
+
+
+def test_open_roi_fails_on_a_truncated_stream(jpeg_path):
+    data, sos = get_scan_start(jpeg_path)
+    for cut in np.linspace(sos + 20, len(data) - 40, 7).astype(int):
+        jpeg_path.write_bytes(data[:cut])
+        assert_fails_like_full_decode(jpeg_path)
@@ -0,0 +1,17 @@
+import pathlib
+import subprocess
+import sys
+import pytest
+from bench_rfu import IMPORT_BANNED_LI, IMPORT_CODE, IMPORT_MODULE_LI
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+@pytest.mark.parametrize('module', IMPORT_MODULE_LI)
+def test_datasheet_module_loads_no_plotting_module(module):
+    "the plotting modules are only loaded when a QC plot is drawn"
+    out = subprocess.check_output(
+        [sys.executable, '-c',
+         IMPORT_CODE.format(module=module, banned=IMPORT_BANNED_LI)],
+        cwd=str(ROOT))
+    assert out.decode('utf-8').split('\n')[1] == ''
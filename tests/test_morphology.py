@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from scipy import ndimage
+from skimage.morphology import closing, dilation, disk, erosion, opening
+from srt_rfu.morphology import (disk_closing, disk_dilation, disk_erosion,
+                                disk_opening)
+
+RADIUS_LI = [1, 2, 3, 4, 11, 12]
+FILTER_LI = [(disk_opening, opening), (disk_closing, closing),
+             (disk_erosion, erosion), (disk_dilation, dilation)]
+
+
+def get_mask_li(radius, seed=0):
+    "random masks at least the disk in both directions, blobs and noise"
+    rng = np.random.RandomState(seed)
+    mask_li = []
+    for fill in (0.2, 0.5, 0.8):
+        shape = tuple(rng.randint(2*radius+1, 2*radius+60, 2))
+        mask_li.append(rng.rand(*shape) < fill)
+        blob = ndimage.gaussian_filter(rng.rand(*shape), radius/2 + 1)
+        mask_li.append(blob > np.quantile(blob, 1 - fill))
+    # regions cut by every edge of the image
+    border = rng.rand(*shape) < 0.5
+    border[0], border[-1], border[:, 0], border[:, -1] = True, True, 1, 1
+    mask_li.append(border)
+    mask_li.append(np.zeros(shape, dtype=bool))
+    mask_li.append(np.ones(shape, dtype=bool))
+    return mask_li
+
+
+@pytest.mark.parametrize('radius', RADIUS_LI)
+@pytest.mark.parametrize('disk_filter, reference', FILTER_LI,
+                         ids=[f.__name__ for f, _ in FILTER_LI])
+def test_matches_skimage(radius, disk_filter, reference):
+    for bw in get_mask_li(radius):
+        assert np.array_equal(disk_filter(bw, radius),
+                              reference(bw, disk(radius)))
+
+
+@pytest.mark.parametrize('radius', [3, 11])
+def test_erosion_and_dilation_match_skimage_on_small_masks(radius):
+    "below the disk size only erosion and dilation keep the border mode"
+    rng = np.random.RandomState(1)
+    for shape in [(1, 1), (1, 9), (4, 5), (9, 2)]:
+        bw = rng.rand(*shape) < 0.5
+        assert np.array_equal(disk_erosion(bw, radius),
+                              erosion(bw, disk(radius)))
+        assert np.array_equal(disk_dilation(bw, radius),
+                              dilation(bw, disk(radius)))
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from srt_rfu.rfu_cube import RfuCube
+
+
+def get_cube(n_cycle=3):
+    rng = np.random.RandomState(n_cycle)
+    cube = RfuCube(['Low Temp', 'High Temp'], ['FAM', 'HEX'],
+                   range(1, n_cycle+1), ['A1', 'B1', 'C1'])
+    cube.data[:] = rng.rand(*cube.data.shape)
+    cube.data[0, 1, 0, 2] = np.nan
+    cube.meta = {'exp_name': 'run', 'quant_step_li': ['QuantStep60']}
+    return cube
+
+
+@pytest.mark.parametrize('mmap_mode', ['r', None])
+@pytest.mark.parametrize('n_cycle', [1, 45])
+def test_save_load_round_trip(tmp_path, mmap_mode, n_cycle):
+    cube = get_cube(n_cycle)
+    cube.save(tmp_path/'rfu')
+    loaded = RfuCube.load(tmp_path/'rfu', mmap_mode=mmap_mode)
+    assert loaded.labels == cube.labels
+    assert loaded.meta == cube.meta
+    assert loaded.data.dtype == cube.data.dtype
+    assert np.array_equal(loaded.data, cube.data, equal_nan=True)
+    assert loaded.loc('High Temp', 'HEX', 1, 'B1') == cube.loc(
+        'High Temp', 'HEX', 1, 'B1')
+
+
+def test_load_by_either_file_and_overwrite(tmp_path):
+    cube = get_cube()
+    cube.save(tmp_path/'rfu')
+    cube.data += 1
+    cube.save(tmp_path/'rfu')
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        'rfu.json', 'rfu.npy']
+    for name in ['rfu.npy', 'rfu.json']:
+        assert np.array_equal(RfuCube.load(tmp_path/name).data, cube.data,
+                              equal_nan=True)
+
+
+def test_loaded_cube_is_read_only(tmp_path):
+    get_cube().save(tmp_path/'rfu')
+    with pytest.raises(ValueError):
+        RfuCube.load(tmp_path/'rfu').data[0, 0, 0, 0] = 1
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from skimage.transform import rotate
+from srt_rfu.im_loader import open_roi
+from srt_rfu.srt_rfu32 import SrtRfu32
+from srt_rfu.srt_rfu96 import SrtRfu32F, SrtRfu32S
+from srt_rfu.synth import get_block_layout_li
+
+BLOCK_ANGLE_LI = [(SrtRfu32F, 180), (SrtRfu32S, 90)]
+
+
+def write_block_frame(block, path):
+    "synthetic frame of the first camera of a block, wells at 120 to 200"
+    _, layout = get_block_layout_li(block)[0]
+    layout.save(path, np.linspace(120, 200, len(layout.well_li)), 'FAM')
+
+
+@pytest.mark.parametrize('cls, angle', BLOCK_ANGLE_LI)
+def test_open_im_matches_skimage_rotate(tmp_path, cls, angle):
+    "np.rot90 of the crop is the old skimage rotate, back on the uint8 scale"
+    block = cls(tmp_path, None)
+    path = tmp_path/'frame.jpg'
+    write_block_frame(block, path)
+    crop = open_roi(path, block.y_range, block.x_range)
+    old = rotate(crop, angle, resize=True)
+    new = block.open_im(path)
+    assert new.shape == old.shape
+    assert np.array_equal(np.round(old*255).astype(np.uint8), new)
+
+
+@pytest.mark.parametrize('cls, angle', BLOCK_ANGLE_LI)
+def test_rotated_block_finds_every_well(tmp_path, cls, angle):
+    block = cls(tmp_path, None)
+    path = tmp_path/'frame.jpg'
+    write_block_frame(block, path)
+    cam = block.cam_keys[0]
+    block.grid = {cam: block.set_grid_single(path, 0)}
+    rfu = block.calculate_rfu(
+        block.get_region_stats(*block.label_image(path)), cam)
+    assert len(rfu) == 16
+    assert min(rfu.values()) > 0
+
+
+@pytest.mark.parametrize('cls, angle', BLOCK_ANGLE_LI)
+def test_rotated_block_cache_params_differ(tmp_path, cls, angle):
+    "cache entries of the skimage rotate path are not reused"
+    params = cls(tmp_path, None).get_cache_params()
+    assert params['algorithm'] > SrtRfu32.ALGORITHM_VERSION
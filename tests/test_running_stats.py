@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+from srt_rfu.running_stats import STAT_LI, RunningStats
+
+CH_LI = ['FAM', 'HEX', 'ROX']
+WELL_LI = ['A1', 'A2', 'B1', 'B2']
+
+
+def get_reference(stat, df_dict):
+    "statistic of every well by channel over all images, by pandas"
+    row_li = []
+    for ch in CH_LI:
+        df = df_dict.get(ch, pd.DataFrame(columns=WELL_LI, dtype=float))
+        mean = df.mean()
+        row_li.append({'mean': mean, 'mean_ratio': mean/mean.mean(),
+                       'std': df.std(), 'cv': df.std()/mean}[stat])
+    return pd.DataFrame(row_li, index=CH_LI)
+
+
+@pytest.mark.parametrize('n_image', [1, 2, 7, 60])
+def test_matches_pandas(n_image):
+    rng = np.random.RandomState(n_image)
+    running_stats = RunningStats(CH_LI, WELL_LI)
+    rows = {ch: [] for ch in CH_LI[:2]}
+    for ch in rng.choice(CH_LI[:2], n_image):
+        rfu_dic = dict(zip(WELL_LI, rng.lognormal(10, 1, len(WELL_LI))))
+        running_stats.update(ch, rfu_dic)
+        rows[ch].append(rfu_dic)
+    # the last channel has no image
+    df_dict = {ch: pd.DataFrame(row_li, columns=WELL_LI, dtype=float)
+               for ch, row_li in rows.items() if row_li}
+    for stat in STAT_LI:
+        pd.testing.assert_frame_equal(
+            running_stats.get_stat(stat), get_reference(stat, df_dict),
+            check_exact=False, rtol=1e-9)
+
+
+def test_unknown_stat():
+    with pytest.raises(ValueError):
+        RunningStats(CH_LI, WELL_LI).get_stat('median')
@@ -0,0 +1,16 @@
+import pathlib
+import numpy as np
+from srt_rfu import srt_rfu16_dummy
+from srt_rfu.srt_rfu16_dummy import SrtRfu16
+
+
+def test_loads_the_step_files_on_the_first_rfu(tmp_path, monkeypatch):
+    "paths do not depend on the working directory, nothing loads in init"
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(srt_rfu16_dummy, '_dummy_data_cache', {})
+    block = SrtRfu16()
+    assert not srt_rfu16_dummy._dummy_data_cache
+    rfu = block.calculate_rfu(pathlib.Path('run_3_0_1_f.jpg'))
+    assert len(srt_rfu16_dummy._dummy_data_cache) == 3
+    assert list(rfu) == block.dummy_well_name[1]
+    assert np.isfinite(list(rfu.values())).any()
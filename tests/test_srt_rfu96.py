@@ -0,0 +1,22 @@
+from collections import OrderedDict
+from srt_rfu.mp_pool import make_shared_array
+from srt_rfu.srt_rfu96 import SrtRfu96
+
+
+def test_load_grid_keeps_the_rectangle_of_each_well(tmp_path, monkeypatch):
+    "mp_grid rows do not depend on the order of the grid dict"
+    rfu = SrtRfu96(tmp_path)
+    rfu.tc = 1
+    rfu.init_blocks()
+    _, rfu.grid_arr = make_shared_array((3, 2, 16, 4))
+    for block_ind, block in enumerate(rfu.get_block_li()):
+        for cam_ind, cam in enumerate(block.cam_keys):
+            well_li = block.get_grid_well_li(cam_ind)
+            grid = OrderedDict(
+                (well, [ind, ind+1, ind+2, ind+3]) for ind, well in
+                reversed(list(enumerate(well_li))))
+            monkeypatch.setattr(block, 'set_grid_single',
+                                lambda im_path, idx=0, grid=grid: grid)
+            rfu.mp_grid(block_ind, cam_ind)
+            rfu.load_grid(block_ind, cam_ind, rfu.grid_arr)
+            assert block.grid[cam] == grid
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from srt_rfu.well_assign import assign_wells
+
+
+def get_grid(well_box):
+    "overlapping 4x4 rectangles like SrtRfu32.set_grid_single"
+    y_li = np.linspace(well_box[0], well_box[2], 5)
+    x_li = np.linspace(well_box[1], well_box[3], 5)
+    grid = {}
+    for i in range(4):
+        for j in range(4):
+            grid['{}{}'.format('ABCD'[j], i+1)] = [
+                y_li[j], x_li[i], y_li[min(j+2, 4)], x_li[min(i+2, 4)]]
+    return grid
+
+
+def assign_region_by_region(grid, y, x):
+    "rectangle and well of each region the way calculate_rfu looped them"
+    well_li = list(grid.keys())
+    rect_li, well_ind_li, center = [], [], {}
+    for y_reg, x_reg in zip(y, x):
+        rect = None
+        for well in well_li:
+            y_min, x_min, y_max, x_max = grid[well]
+            if y_min < y_reg < y_max and x_min < x_reg < x_max:
+                rect = well
+                break
+        rect_li.append(-1 if rect is None else well_li.index(rect))
+        well_ind_li.append(-1)
+        if rect is None:
+            continue
+        center.setdefault(rect, (x_reg, y_reg))
+        for ind, well in enumerate(well_li):
+            y_min, x_min, y_max, x_max = grid[well]
+            if y_min < y_reg < y_max and x_min < x_reg < x_max:
+                distance = np.linalg.norm(
+                    np.array([x_reg, y_reg]) - center[rect])
+                if distance < (x_max - x_min)/2 - 50:
+                    well_ind_li[-1] = ind
+                    break
+    return rect_li, well_ind_li
+
+
+@pytest.mark.parametrize('n_region', [0, 1, 2, 40, 300])
+def test_matches_region_by_region(n_region):
+    rng = np.random.RandomState(n_region)
+    for _ in range(5):
+        well_box = np.sort(rng.randint(0, 1600, (2, 2)), axis=0).ravel() + [
+            0, 0, 600, 600]
+        grid = get_grid(well_box)
+        # integer centroids, some on the rectangle edges, some off the grid
+        y = rng.randint(well_box[0] - 50, well_box[2] + 50, n_region)
+        x = rng.randint(well_box[1] - 50, well_box[3] + 50, n_region)
+        y[::7] = well_box[0]
+        well_li, rect_ind, well_ind, _, _ = assign_wells(grid, y, x)
+        rect_ref, well_ref = assign_region_by_region(grid, y, x)
+        assert well_li == list(grid.keys())
+        assert rect_ind.tolist() == rect_ref
+        assert well_ind.tolist() == well_ref
+
+
+def test_first_region_of_a_rectangle_sets_its_center():
+    grid = {'A1': [0, 0, 300, 300]}
+    y, x = [150, 150, 240], [150, 240, 150]
+    well_li, rect_ind, well_ind, center_ind, radius = assign_wells(
+        grid, y, x)
+    assert rect_ind.tolist() == [0, 0, 0]
+    assert center_ind.tolist() == [0]
+    assert radius.tolist() == [100]
+    # 90 pixels off the center is in the well, 90*sqrt(2) would not be
+    assert well_ind.tolist() == [0, 0, 0]
+    _, _, well_ind, _, _ = assign_wells(grid, [150, 240], [150, 240])
+    assert well_ind.tolist() == [0, -1]